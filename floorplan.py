@@ -31,23 +31,68 @@ To annotate a square, click on a square in the grid. Click again to undo.
 To choose the attribute you wish to annotate with using Options > Editing mode.
 
 3. Save to file
-Choose File > Save in order to save the layout to txt (default: floor.txt)
+Choose File > Save in order to save the layout to txt (default: floor.txt), and
+with its precomputed distances to a binary floor file beside it (floor.floor,
+see test/floorfile.py)
 
 4. Load and edit from file
 (NotImplemented)
+
+5. Large floors
+With --raster, the grid is drawn as one image on a canvas instead of one
+button per square, so floors of any size stay interactive. Choose a tool in
+Options > Tool: the brush paints squares as you drag, the rectangle fills the
+box you drag out, and the fill paints the connected region of squares alike to
+the one clicked. Check 'erase' to take the attribute away instead. File > Open
+and File > Save read and write the txt layout (default: floor.txt).
 '''
 
 import PySimpleGUI as sg
 from random import randint
 import argparse
-from collections import defaultdict
-import pickle
+from collections import defaultdict, deque
 import pprint
 from functools import lru_cache
+import os
+import struct
+import sys
+import zlib
+
+import numpy as np
+
+# the floor-loading core is shared with the simulator, in test/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'test'))
+import floorfile
+import floorload
+from floorgrid import ATTRS, BIT
 
 
 pp = pprint.PrettyPrinter(indent=4)
 
+
+def color(attrs):
+    '''
+    colour of a square with the attributes `attrs`
+    '''
+    if 'W' in attrs:
+        return 'grey' if 'F' not in attrs else 'yellow'
+    elif 'B' in attrs:
+        return 'lightblue' if 'F' not in attrs else 'aquamarine'
+    elif 'F' in attrs:
+        return 'red'
+    elif 'S' in attrs:
+        return 'lightgreen' 
+    elif 'P' in attrs:
+        return 'purple' if 'F' not in attrs else 'aquamarine'
+    elif 'N' in attrs:
+        return 'lightgrey'
+    elif 'H' in attrs:
+        return 'pink'
+    elif 'M' in attrs:
+        return 'orange'
+    return 'lightgrey'
+
 class FloorGUI:
 
     def __init__(self, R, C, output=None):
@@ -109,64 +154,21 @@ class FloorGUI:
 
     def parse(self, floorlines):
         '''
-        method that takes a string representation of the grid and constructs a graph
-        useful for a simulation
+        method that takes a string representation of the grid and constructs a
+        precomputed FloorGrid useful for a simulation (see floorload.py, shared
+        with the simulator)
         '''
-        grid = []
-        for row in floorlines:
-            if not row: continue
-            sqs = row.split(';')
-            rowattrs = [set(sq.strip().split(',')) for sq in sqs]
-            print(rowattrs)
-            grid += [rowattrs]
-
-
-        graph = defaultdict(lambda: {'nbrs': set()})
-        meta = dict(bottleneck=set(), danger=set(), wall=set(), safe=set())
-
-        R, C = len(grid), len(grid[0])
-       
-        for i in range(R):
-            for j in range(C):
-                attrs = grid[i][j]
-                graph[(i,j)].update({att:int(att in attrs) for att in 'WSBFNPHM'})
-                
-                for off in {-1, 1}:
-                    if 0 <= i+off < R:
-                        graph[(i,j)]['nbrs'].add((i+off, j))
-
-                    if 0 <= j+off < C:
-                        graph[(i,j)]['nbrs'].add((i, j+off))
-
-
-        def bfs(target, pos): # iterative dfs
-            if graph[pos]['W']: return float('inf')
-            q = [(pos, 0)]
-            visited = set()
-            while q:
-                node, dist = q.pop()
-                if node in visited: continue
-                visited.add(node)
-
-                node = graph[node]
-                if node['W'] or node['F']: continue
-                if node[target]: return dist
-
-                for n in node['nbrs']:
-                    if n in visited: continue
-                    q = [(n, dist+1)] + q
-
-            return float('inf')
-                
-        for i in range(R):
-            for j in range(C):
-                graph[(i,j)]['distF'] = bfs('F', (i,j)) 
-                graph[(i,j)]['distS'] = bfs('S', (i,j))
-
-        self.graph = dict(graph.items())
-        pp.pprint(self.graph) 
+        grid = floorload.parse('\n'.join(floorlines), neighbours=4)
+        floorload.precompute(grid)
+        self.graph = grid
         return self.graph
 
+    def floorpath(self):
+        '''
+        return: the binary floor file saved beside the txt layout
+        '''
+        return os.path.splitext(self.output)[0] + '.floor'
+
 
     def save(self):
         '''
@@ -183,50 +185,35 @@ class FloorGUI:
                     for j in range(C)]
             gridstr += ';'.join(txts) + '\n'
 
-        graph = self.parse(gridstr.split('\n'))
+        grid = self.parse(gridstr.split('\n'))
 
-        with open(self.output+'.pkl', 'wb') as out:
-            pickle.dump(graph, file=out)
+        floorfile.save(self.floorpath(), grid)
         with open(self.output, 'w') as out:
             print(gridstr, file=out)
 
 
-    def load(self, graph):
+    def load(self, grid):
         '''
-        loads from input.txt.pkl
+        shows the floor `grid` (a FloorGrid) on the buttons
         '''
         window = self.window
-        self.graph = graph 
-        for loc, data in self.graph.items():
-            square = window.Element(loc)
-            attrs = {att for att in data if att is not 'nbrs' and data[att]}
+        self.graph = grid
+        for (i, j), bits in np.ndenumerate(grid.mask):
+            square = window.Element((i, j))
+            attrs = attrs_of(bits)
             attrs.intersection_update(set('WSFBNPHM'))
-            if 'W' in attrs:
-                color = 'grey' if 'F' not in attrs else 'yellow'
-            elif 'B' in attrs:
-                color = 'lightblue' if 'F' not in attrs else 'aquamarine'
-            elif 'F' in attrs:
-                color = 'red'
-            elif 'S' in attrs:
-                color = 'lightgreen' 
-            elif 'P' in attrs:
-                color = 'purple' if 'F' not in attrs else 'aquamarine'
-            elif 'N' in attrs:
-                color = 'lightgrey'
-            elif 'H' in attrs:
-                color = 'pink'
-            elif 'M' in attrs:
-                color = 'orange'
             square.Update(','.join(reversed(sorted(attrs))), 
-                          button_color=('white', color))
+                          button_color=('white', color(attrs)))
 
 
     def loadtxt(self):
         '''
+        loads the binary floor file saved beside the txt layout, or the txt
+        layout if there is none (see floorfile.read)
         '''
-        with open(self.output+'.pkl', 'rb') as pklf:
-            graph = pickle.load(pklf)
-        self.load(graph) 
+        path = self.floorpath()
+        self.load(floorfile.read(path if os.path.exists(path)
+                                 else self.output))
 
 
     def click(self, event, values):
@@ -353,25 +340,390 @@ class FloorGUI:
             print('Unknown event:', event)
 
 
+# RGB of the colours of color()
+RGB = {'grey': (190, 190, 190), 'yellow': (255, 255, 0),
+       'lightblue': (173, 216, 230), 'aquamarine': (127, 255, 212),
+       'red': (255, 0, 0), 'lightgreen': (144, 238, 144),
+       'purple': (160, 32, 240), 'lightgrey': (211, 211, 211),
+       'pink': (255, 192, 203), 'orange': (255, 165, 0)}
+
+
+def attrs_of(bits):
+    return {att for att in ATTRS if bits & BIT[att]}
+
+
+def png(rgb):
+    '''
+    encodes an RxCx3 uint8 image as PNG, which tk displays without PIL
+    '''
+    R, C, _ = rgb.shape
+    raw = np.zeros((R, 1 + 3*C), dtype=np.uint8)   # filter byte 0 per row
+    raw[:, 1:] = rgb.reshape(R, -1)
+
+    def chunk(kind, data):
+        return (struct.pack('>I', len(data)) + kind + data
+                + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', C, R, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw.tobytes(), 1))
+            + chunk(b'IEND', b''))
+
+
+class FloorRaster:
+    '''
+    floor plan as an RxC array of attribute bits (see BIT) instead of one
+    button per square, with the editing tools of the raster editor. tools
+    return the box of squares they changed, so only that part of the image
+    has to be redrawn. like FloorGUI, the safe zone around the edge cannot be
+    edited
+    ---
+    bits (ndarray): RxC uint8 attribute bits
+    '''
+    bits = None
+
+    # attribute each editing mode annotates, and attributes it cannot be
+    # placed on
+    modes = {'Walls': ('W', ''), 'Bottleneck': ('B', 'WP'),
+             'Danger': ('F', ''), 'People': ('P', 'WB'),
+             'Hot': ('H', 'WB'), 'Medinum': ('M', 'WB'), 'Safe': ('S', 'W')}
+
+    # colour of every combination of bits
+    rgb = np.array([RGB[color(attrs_of(b))] for b in range(256)],
+                   dtype=np.uint8)
+
+    def __init__(self, R, C):
+        '''
+        constructor method: an empty floor, ringed by a safe zone
+        '''
+        self.bits = np.full((R, C), BIT['S'], dtype=np.uint8)
+        self.bits[1:-1, 1:-1] = BIT['N']
+
+    @property
+    def shape(self):
+        return self.bits.shape
+
+    def image(self, box=None, cell=1):
+        '''
+        return: RGB image of the squares in `box` (i0, j0, i1, j1; default:
+        the whole floor), `cell` pixels to a side per square
+        '''
+        i0, j0, i1, j1 = box or (0, 0) + self.shape
+        rgb = self.rgb[self.bits[i0:i1, j0:j1]]
+        if cell > 1:
+            rgb = rgb.repeat(cell, axis=0).repeat(cell, axis=1)
+        return rgb
+
+    def paint(self, where, mode, erase=False):
+        '''
+        annotates the squares where `where` is True with the attribute of
+        `mode`, or takes it away if `erase`
+        ---
+        where (ndarray): RxC bool mask
+        mode (str): editing mode (see modes)
+
+        return: box (i0, j0, i1, j1) of the squares changed, or None
+        '''
+        att, forbidden = self.modes[mode]
+        bits = self.bits
+        editable = np.zeros(bits.shape, dtype=bool)
+        editable[1:-1, 1:-1] = True
+        where = where & editable
+        for f in forbidden:
+            where &= bits & BIT[f] == 0
+
+        old = bits.copy()
+        if erase:
+            bits[where] &= ~np.uint8(BIT[att])
+            # squares left with nothing are normal
+            empty = where & (bits & ~np.uint8(BIT['N']) == 0)
+            bits[empty] |= BIT['N']
+        else:
+            if att == 'F':
+                bits[where] &= ~np.uint8(BIT['B'])
+            bits[where] |= BIT[att]
+            bits[where] &= ~np.uint8(BIT['N'])
+
+        changed = np.argwhere(bits != old)
+        if not changed.size:
+            return None
+        (i0, j0), (i1, j1) = changed.min(axis=0), changed.max(axis=0) + 1
+        return int(i0), int(j0), int(i1), int(j1)
+
+    def brush(self, i, j, mode, size=1, erase=False):
+        '''
+        paints the size x size squares centred on (i, j)
+        '''
+        where = np.zeros(self.shape, dtype=bool)
+        r = size // 2
+        where[max(0, i-r):i-r+size, max(0, j-r):j-r+size] = True
+        return self.paint(where, mode, erase)
+
+    def stroke(self, a, b, mode, size=1, erase=False):
+        '''
+        paints with the brush along the line from square `a` to square `b`,
+        so fast drags leave no gaps
+        '''
+        n = max(abs(b[0]-a[0]), abs(b[1]-a[1])) + 1
+        i = np.rint(np.linspace(a[0], b[0], n)).astype(int)
+        j = np.rint(np.linspace(a[1], b[1], n)).astype(int)
+        where = np.zeros(self.shape, dtype=bool)
+        r = size // 2
+        R, C = self.shape
+        for di in range(-r, size-r):
+            for dj in range(-r, size-r):
+                ii, jj = i+di, j+dj
+                ok = (0 <= ii) & (ii < R) & (0 <= jj) & (jj < C)
+                where[ii[ok], jj[ok]] = True
+        return self.paint(where, mode, erase)
+
+    def rectangle(self, a, b, mode, erase=False):
+        '''
+        paints every square in the box with corners `a` and `b`
+        '''
+        where = np.zeros(self.shape, dtype=bool)
+        where[min(a[0], b[0]):max(a[0], b[0])+1,
+              min(a[1], b[1]):max(a[1], b[1])+1] = True
+        return self.paint(where, mode, erase)
+
+    def fill(self, i, j, mode, erase=False):
+        '''
+        paints the region of squares with the same attributes as (i, j) that
+        are connected to it side by side
+        '''
+        R, C = self.shape
+        same = np.zeros((R, C+2), dtype=np.int8)
+        same[:, 1:-1] = self.bits == self.bits[i, j]
+
+        # the region is searched run by run rather than square by square:
+        # a run is a horizontal stretch of alike squares, [start, end)
+        edges = np.diff(same, axis=1)
+        rows, starts = np.nonzero(edges == 1)
+        ends = np.nonzero(edges == -1)[1]
+        first = np.searchsorted(rows, np.arange(R+1))
+
+        def run_at(r, j):
+            a = first[r]
+            return a + np.searchsorted(starts[a:first[r+1]], j, 'right') - 1
+
+        seen = np.zeros(rows.size, dtype=bool)
+        seed = run_at(i, j)
+        seen[seed] = True
+        q = deque([seed])
+        where = np.zeros((R, C), dtype=bool)
+        while q:
+            k = q.popleft()
+            r, s, e = rows[k], starts[k], ends[k]
+            where[r, s:e] = True
+            for n in (r-1, r+1):
+                if not 0 <= n < R:
+                    continue
+                # runs of the next row that overlap this one
+                a = first[n] + np.searchsorted(ends[first[n]:first[n+1]], s,
+                                               'right')
+                b = first[n] + np.searchsorted(starts[first[n]:first[n+1]],
+                                               e)
+                for m in range(a, b):
+                    if not seen[m]:
+                        seen[m] = True
+                        q.append(m)
+        return self.paint(where, mode, erase)
+
+    def save(self, path):
+        '''
+        writes the layout in the txt format of FloorGUI.save
+        '''
+        with open(path, 'w') as out:
+            floorload.totxt(self.bits, out)
+            print(file=out)
+
+    @classmethod
+    def load(cls, path):
+        '''
+        return: FloorRaster of a txt layout
+        '''
+        with open(path) as f:
+            grid = floorload.parse(f, neighbours=4)
+        floor = cls.__new__(cls)
+        floor.bits = np.array(grid.mask)
+        return floor
+
+
+class RasterGUI:
+    '''
+    editor of large floor plans: the floor is one image on an sg.Graph, cut
+    into tiles so that an edit redraws only the tiles it touched
+    '''
+    tile = 64 # squares per side of a tile
+
+    tools = ['Brush', 'Rectangle', 'Fill']
+
+    def __init__(self, R, C, output=None, cell=None):
+        '''
+        constructor method
+        ---
+        cell (int): pixels per side of a square (default: fit the floor to
+                    about 800 pixels)
+        '''
+        self.mode = 'Walls'
+        self.tool = 'Brush'
+        self.output = output
+        self.floor = FloorRaster(R, C)
+        self.cell = cell
+        self.window = None
+        self.canvas = None
+        self.figures = {} # tile --> id of its image on the canvas
+        self.start = self.last = None # where the current drag began, and is
+
+    def setup(self):
+        '''
+        makes the window for the current floor
+        '''
+        R, C = self.floor.shape
+        cell = self.cell or max(1, 800 // max(R, C))
+        self.px = cell
+
+        menu_def = [['File', ['Reset', 'Open', 'Save', 'Exit']],
+                    ['Options', ['Editing mode',
+                                 list(FloorRaster.modes),
+                                 'Tool', self.tools]],
+                    ['Help', '(NotImplemented) About...'], ]
+        self.canvas = sg.Graph((C*cell, R*cell), (0, R*cell), (C*cell, 0),
+                               key='floor', enable_events=True,
+                               drag_submits=True)
+        layout = [[sg.Menu(menu_def, tearoff=True)],
+                  [sg.Text(self.status(), key='mode', size=(40, 1)),
+                   sg.Text('brush size'),
+                   sg.Slider((1, 25), 1, orientation='h', key='size',
+                             size=(15, 10)),
+                   sg.Checkbox('erase', key='erase')],
+                  [sg.Column([[self.canvas]], scrollable=True,
+                             size=(min(C*cell, 800) + 20,
+                                   min(R*cell, 600) + 20))]]
+        if self.window is not None:
+            self.window.Close()
+        self.window = sg.Window('simulation floor layout designer', layout,
+                                finalize=True)
+        self.figures = {}
+        self.redraw()
+        return self.window
+
+    def status(self):
+        return 'editing mode: {}, tool: {}'.format(self.mode, self.tool)
+
+    def redraw(self, box=None):
+        '''
+        redraws the tiles that overlap `box` (default: all of them)
+        '''
+        if box is None:
+            return self.redraw((0, 0) + self.floor.shape)
+        R, C = self.floor.shape
+        t, px = self.tile, self.px
+        i0, j0, i1, j1 = box
+        for ti in range(i0 // t, (i1-1) // t + 1):
+            for tj in range(j0 // t, (j1-1) // t + 1):
+                tile = (ti*t, tj*t, min(R, (ti+1)*t), min(C, (tj+1)*t))
+                old = self.figures.pop((ti, tj), None)
+                if old is not None:
+                    self.canvas.DeleteFigure(old)
+                data = png(self.floor.image(tile, px))
+                self.figures[ti, tj] = self.canvas.DrawImage(
+                    data=data, location=(tile[1]*px, tile[0]*px))
+
+    def square(self, xy):
+        '''
+        return: square under the canvas point `xy`, or None if off the floor
+        '''
+        if xy is None or None in xy:
+            return None
+        x, y = xy
+        R, C = self.floor.shape
+        i, j = int(y) // self.px, int(x) // self.px
+        if 0 <= i < R and 0 <= j < C:
+            return i, j
+        return None
+
+    def click(self, event, values):
+        '''
+        handles an event of the window
+        '''
+        floor = self.floor
+        erase = values.get('erase', False) if values else False
+        size = int(values.get('size', 1)) if values else 1
+
+        if event == 'floor':
+            # pressing or dragging on the canvas
+            sq = self.square(values['floor'])
+            if sq is None:
+                return
+            box = None
+            if self.start is None:
+                self.start = sq
+                if self.tool == 'Brush':
+                    box = floor.brush(*sq, self.mode, size, erase)
+                elif self.tool == 'Fill':
+                    box = floor.fill(*sq, self.mode, erase)
+            elif self.tool == 'Brush' and sq != self.last:
+                box = floor.stroke(self.last, sq, self.mode, size, erase)
+            self.last = sq
+            if box:
+                self.redraw(box)
+
+        elif event == 'floor+UP':
+            if self.tool == 'Rectangle' and self.start is not None:
+                end = self.square(values['floor']) or self.last
+                box = floor.rectangle(self.start, end, self.mode, erase)
+                if box:
+                    self.redraw(box)
+            self.start = self.last = None
+
+        elif event == 'Save':
+            print('saving to', self.output)
+            floor.save(self.output)
+
+        elif event == 'Open':
+            self.floor = FloorRaster.load(self.output)
+            self.setup()
+
+        elif event == 'Reset':
+            self.floor = FloorRaster(*floor.shape)
+            self.redraw()
+
+        elif event in FloorRaster.modes:
+            self.mode = event
+            self.window.Element('mode').Update(self.status())
+
+        elif event in self.tools:
+            self.tool = event
+            self.window.Element('mode').Update(self.status())
+
+        else:
+            print('Unknown event:', event)
+
+
 def main(args):
     '''
     main method: setup board, and handle the event lifecycle
     '''
     R, C = args.rows, args.cols
-    assert 1 < R <= 150 and  1 < C <= 150, 'rows and columns must be 1< x <=20'
-
-    grid = FloorGUI(R, C, args.output) 
-    window = grid.setup()
+    if args.raster:
+        assert 1 < R and 1 < C, 'rows and columns must be 1< x'
+        grid = RasterGUI(R, C, args.output, args.cell)
+    else:
+        assert 1 < R <= 150 and  1 < C <= 150, 'rows and columns must be 1< x <=20'
+        grid = FloorGUI(R, C, args.output) 
+    grid.setup()
         
     while True:
         #如果會卡住 把下面這行改成 event, values = window.Read(timeout=10)
-        event, values = window.Read()
+        # (the raster editor makes a new window when it opens a floor)
+        event, values = grid.window.Read()
         if event in (None, 'Exit'):
             break
 
         grid.click(event, values)
 
-    window.Close()
+    grid.window.Close()
 
 
 if __name__ == '__main__':
@@ -383,6 +735,12 @@ if __name__ == '__main__':
                         help='number of cols in the grid. max: 150')
     parser.add_argument('-o', '--output', default='floor.txt', type=str,
                         help='name of file to output plan to')
+    parser.add_argument('--raster', action='store_true',
+                        help='edit the floor as one image, for floors larger '
+                             'than 150x150')
+    parser.add_argument('--cell', type=int, default=None,
+                        help='pixels per square in --raster mode (default: '
+                             'fit the floor to about 800 pixels)')
     global args
     args = parser.parse_args()
     
@@ -1,35 +1,37 @@
-import random
+import os
+import sys
+from argparse import ArgumentParser
 
-# 讀取文本文件
-with open('floorplan.txt', 'r') as file:
-    content = file.read()
+# 場景產生器與模擬器共用，放在 test/ 裡
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'test'))
+from scenarios import ScenarioGenerator
 
+parser = ArgumentParser(description='從一個樓層產生隨機的人員與火源場景')
+parser.add_argument('-i', '--input', type=str, default='floorplan.txt',
+                    help='樓層檔 (預設: floorplan.txt)')
+parser.add_argument('-o', '--output', type=str, default='floorplan1.txt',
+                    help='輸出檔，.floor 結尾則寫成二進位樓層檔；產生多個場景時'
+                         '會加上編號，例如 floorplan1-000.txt (預設: '
+                         'floorplan1.txt)')
+parser.add_argument('-k', '--scenarios', type=int, default=1,
+                    help='要產生幾個場景 (預設: 1)')
+parser.add_argument('-r', '--random_state', type=int, default=None,
+                    help='亂數種子，同一個種子產生同樣的場景 (預設: 隨機)')
 # 定義有幾趴的機率將N轉換成P
-F_probability = 0.01
-N_probability = 0.3    
-M_probability = 0.45
-H_probability = 0.6
+parser.add_argument('--fire', type=float, default=0.01,
+                    help='W、N、M、H 變成 F 的機率 (預設: 0.01)')
+parser.add_argument('--normal', type=float, default=0.3,
+                    help='N 變成 P 的機率 (預設: 0.3)')
+parser.add_argument('--medium', type=float, default=0.45,
+                    help='M 變成 P 的機率，否則變成 N (預設: 0.45)')
+parser.add_argument('--hot', type=float, default=0.6,
+                    help='H 變成 P 的機率，否則變成 N (預設: 0.6)')
+args = parser.parse_args()
 
-# 將文本中的 "N" 替換成 "p"，以一定的機率
-new_content = ""
-for char in content:
-    if (char == 'W' or char == 'N' or char == 'M' or char == 'H') and random.random() < F_probability:
-        new_content += 'F'
-    elif char == 'N' and random.random() < N_probability:
-        new_content += 'P'
-    elif char == 'H':
-        if random.random() < H_probability:
-            new_content += 'P'
-        else:
-            new_content += 'N'
-    elif char == 'M':
-        if random.random() < M_probability:
-            new_content += 'P'
-        else:
-            new_content += 'N'
-    else:
-        new_content += char
-
-# 寫回文本文件
-with open('floorplan1.txt', 'w') as file:
-    file.write(new_content)
\ No newline at end of file
+# 樓層只讀一次，每個場景用陣列一次抽完
+generator = ScenarioGenerator(args.input, fire=args.fire,
+                              people={'N': args.normal, 'M': args.medium,
+                                      'H': args.hot})
+for path in generator.write(args.output, args.scenarios, args.random_state):
+    print(path)
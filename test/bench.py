@@ -0,0 +1,215 @@
+'''
+This file accompanies other files in the evacuation simulation project.
+
+In this file we benchmark the simulator on the bundled floors (in/*.txt and
+../floorplan.txt), as they are and upscaled: every square becomes an s x s
+block, so a floor scaled by 2 has four times the squares and the people. for
+each floor and scale we measure, in a fresh process so peaks do not carry
+over:
+
+    parse_s        FloorParser parsing the txt floor
+    precompute_s   computing its distance fields (no cache)
+    run_s          evacuating everyone, fire not spreading
+    run_fire_s     evacuating everyone, fire spreading
+    events_per_s   simulus events scheduled per second of run_fire_s
+    peak_mib       peak resident memory of the process
+
+runs use fixed seeds, so they are reproducible. floors without people
+(floorplan.txt only has hot and medium squares) are populated with scenario 0
+of the seed (see scenarios.py). results are written to a JSON file, and
+compared against a baseline written the same way: measurements more than
+--tolerance slower or bigger than the baseline's are reported as regressions,
+and the exit status is 1 if there are any.
+
+    python bench.py -o baseline.json
+    python bench.py -o bench.json --baseline baseline.json
+'''
+
+from argparse import ArgumentParser, SUPPRESS
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from parsebench import maxrss
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FLOORS = sorted(glob.glob(os.path.join(HERE, 'in', '*.txt'))) + [
+    os.path.join(HERE, '..', 'floorplan.txt')]
+
+# measurements compared against the baseline
+METRICS = ('parse_s', 'precompute_s', 'run_s', 'run_fire_s', 'peak_mib')
+# differences below these are noise, whatever the ratio
+NOISE = {'parse_s': .01, 'precompute_s': .01, 'run_s': .05,
+         'run_fire_s': .05, 'peak_mib': 5.}
+
+
+def upscale(src, dst, scale):
+    '''
+    writes the floor at `src`, every square made a `scale` x `scale` block,
+    as a txt floor to `dst`
+    '''
+    import floorload
+
+    mask = floorload.load(src).mask
+    mask = np.repeat(np.repeat(mask, scale, axis=0), scale, axis=1)
+    with open(dst, 'w') as out:
+        floorload.totxt(mask, out)
+
+
+def measure(path, engine, seed):
+    '''
+    measures one floor in this process
+    ---
+    path (str): txt floor
+    engine (str): 'simulus' or 'vectorized' (see FireSim.simulate)
+    seed (int): seed of the people's and the fire's random streams
+
+    return: dict of measurements
+    '''
+    from floorparse import FloorParser
+    from floorgrid import BIT
+    from scenarios import ScenarioGenerator
+    from evacuate import FireSim, make_generators
+    from profiling import Profiler
+    import floorload
+
+    record = {}
+    start = time.perf_counter()
+    with open(path) as f:
+        grid = FloorParser().parse_file(f)
+    record['parse_s'] = time.perf_counter() - start
+
+    if not grid.has('P').any():
+        grid.padded[1:-1, 1:-1] = next(ScenarioGenerator(grid).masks(1, seed))
+    record['size'] = list(grid.shape)
+    record['people'] = int(grid.has('P').sum())
+
+    start = time.perf_counter()
+    floorload.precompute(grid)
+    record['precompute_s'] = time.perf_counter() - start
+
+    for spread_fire, name in ((False, 'run'), (True, 'run_fire')):
+        profiler = Profiler()
+        *generators, hazard_generator = make_generators(seed)
+        floor = FireSim(grid, *generators, hazard_generator=hazard_generator,
+                        profiler=profiler)
+        profiler.run(floor.simulate, spread_fire=spread_fire, engine=engine)
+        record[name + '_s'] = profiler.wall
+        record[name + '_safe'], record[name + '_dead'], _ = \
+            floor.people.tally()
+        record[name + '_sim_time'] = profiler.sim_time
+    if engine == 'simulus':
+        record['events_per_s'] = profiler.scheduled / profiler.wall
+
+    record['peak_mib'] = maxrss()
+    return record
+
+
+def compare(records, baseline, tolerance):
+    '''
+    return: list of (floor, scale, metric, baseline value, value) of the
+    measurements more than `tolerance` (a fraction) above the baseline's
+    '''
+    base = {(r['floor'], r['scale'], r['engine']): r for r in baseline}
+    regressions = []
+    for r in records:
+        b = base.get((r['floor'], r['scale'], r['engine']))
+        if b is None:
+            continue
+        for metric in METRICS:
+            old, new = b.get(metric), r.get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + tolerance) and new - old > NOISE[metric]:
+                regressions.append((r['floor'], r['scale'], metric, old, new))
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(description='benchmark the simulator on the '
+                                        'bundled floors, upscaled')
+    parser.add_argument('-f', '--floors', type=str, nargs='+', default=None,
+                        help='floors to benchmark (default: in/*.txt and '
+                             '../floorplan.txt)')
+    parser.add_argument('-s', '--scales', type=int, nargs='+',
+                        default=[1, 2, 4, 8],
+                        help='upscaling factors (default: 1 2 4 8)')
+    parser.add_argument('-e', '--engine', type=str, default='simulus',
+                        choices=['simulus', 'vectorized'],
+                        help='event engine, or vectorized time steps')
+    parser.add_argument('-r', '--random_state', type=int, default=8675309,
+                        help='aka. seed (default:8675309)')
+    parser.add_argument('-o', '--output', type=str, default='bench.json',
+                        help='where to write the results (default: '
+                             'bench.json)')
+    parser.add_argument('--baseline', type=str, default=None,
+                        help='results of an earlier run to compare against')
+    parser.add_argument('--tolerance', type=float, default=.25,
+                        help='slowdown (or growth in memory) over the '
+                             'baseline reported as a regression (default: '
+                             '.25)')
+    parser.add_argument('--measure', nargs=3,
+                        metavar=('PATH', 'ENGINE', 'SEED'), help=SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        path, engine, seed = args.measure
+        record = measure(path, engine, int(seed))
+        # the simulation may print too; the record is the last line
+        print('\n' + json.dumps(record))
+        return
+
+    print('{:>24} {:>5} {:>9} {:>7} {:>9} {:>10} {:>8} {:>10} {:>10} '
+          '{:>8}'.format('floor', 'scale', 'size', 'people', 'parse s',
+                         'precomp s', 'run s', 'run fire s', 'events/s',
+                         'peak MiB'))
+    records = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for floor in args.floors or FLOORS:
+            name = os.path.basename(floor)
+            for scale in args.scales:
+                path = os.path.join(tmp, '{}x{}'.format(scale, name))
+                upscale(floor, path, scale)
+                out = subprocess.run(
+                    [sys.executable, __file__, '--measure', path,
+                     args.engine, str(args.random_state)],
+                    check=True, capture_output=True, text=True, cwd=HERE)
+                record = dict(floor=name, scale=scale, engine=args.engine,
+                              **json.loads(out.stdout.splitlines()[-1]))
+                records.append(record)
+                print('{:>24} {:>5} {:>9} {:>7} {:>9.3f} {:>10.3f} {:>8.3f} '
+                      '{:>10.3f} {:>10.0f} {:>8.1f}'.format(
+                          name, scale, '{}x{}'.format(*record['size']),
+                          record['people'], record['parse_s'],
+                          record['precompute_s'], record['run_s'],
+                          record['run_fire_s'],
+                          record.get('events_per_s', 0),
+                          record['peak_mib']), flush=True)
+
+    results = dict(python=platform.python_version(), numpy=np.__version__,
+                   machine=platform.machine(), seed=args.random_state,
+                   records=records)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['records']
+        regressions = compare(records, baseline, args.tolerance)
+        for floor, scale, metric, old, new in regressions:
+            print('REGRESSION\t{} x{}: {} {:.3f} -> {:.3f} ({:+.0%})'.format(
+                floor, scale, metric, old, new, new/old - 1))
+        if regressions:
+            sys.exit(1)
+        print('no regressions against', args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -8,31 +8,52 @@ In this file we define a useful class to model bottlenecks, 'Bottleneck'
 from collections import deque
 
 # bottleneck object, represents an area where people must queue to leave, given
-# a set rate at which they can pass through, one by one
+# a set rate at which they can pass through. it is a server: while anyone is
+# queued, it lets up to `capacity` people through per departure, first come
+# first served, and it is idle (schedules nothing) while its queue is empty
 class Bottleneck():
     loc = None, None
     queue = None
     numInQueue = 0
+    capacity = 1    # people let through per departure
+    busy = False    # whether a departure is scheduled
 
-    # takes a person, and inserts them into the queue of the bottleneck
+    # takes a person, and inserts them into the queue of the bottleneck.
+    # returns True if the bottleneck was idle, i.e. the caller must schedule
+    # its next departure
     def enterBottleNeck(self, person, throughput=1):
         self.queue.append(person)
         self.numInQueue = self.numInQueue + throughput
+        if self.busy:
+            return False
+        self.busy = True
+        return True
 
-    # removes a person from the queue
+    # removes the person who has waited longest from the queue
     def exitBottleNeck(self, throughput=1):
         if(len(self.queue) > 0):
-            personLeaving = self.queue.pop()
+            personLeaving = self.queue.popleft()
             self.numInQueue = self.numInQueue - throughput
             return personLeaving
         else:
             return None
 
-    def __init__(self, loc):
+    # one departure: removes up to `capacity` people, first in first out.
+    # the bottleneck goes idle once its queue is empty
+    def serve(self):
+        leaving = []
+        while self.queue and len(leaving) < self.capacity:
+            leaving.append(self.exitBottleNeck())
+        self.busy = len(self.queue) > 0
+        return leaving
+
+    def __init__(self, loc, capacity=1):
         '''
         constructor method
         ---
         loc (tuple xy): location (coordinates) of this bottleneck
+        capacity (int): people let through per departure
         '''
         self.loc = loc              # coordinates of the bottleneck
         self.queue = deque()        # queue to represents the bottleneck
+        self.capacity = capacity
@@ -0,0 +1,712 @@
+'''
+This file accompanies other files in the evacuation simulation project.
+
+In this file we define the distance-field engine, 'DistanceField', which
+computes for every square of the floor its distance to the nearest safe zone,
+to each exit, and to the nearest fire, using one multi-source breadth-first
+sweep per target set rather than one search per square. exits are found on the
+floor itself (see find_exits), so any floor gets per-exit routing.
+
+fields are flat float arrays laid out like FloorGrid.padded, so neighbours are
+found by adding the grid's flat offsets.
+
+distances count steps by default, diagonal ones included. the octile metric
+measures them instead: a diagonal step is sqrt(2) long, and people may not cut
+a wall's corner diagonally. the sweep then relaxes whole frontiers as the
+steps metric does, except that a square already reached is entered again if
+a shorter way in turns up, so it takes about as many passes as there are
+steps on the longest route.
+'''
+
+from collections import deque
+from heapq import heapify, heappush, heappop
+import numpy as np
+
+from floorgrid import BIT, STENCIL4
+
+INF = float('inf')
+NODOOR = (-1, -1)
+# relative difference below which two octile distances are taken as equal:
+# sums of 1 and sqrt(2) in a different order, or rounded to float32, differ
+# in their last bits
+TOLERANCE = 1e-6
+
+
+def step_lengths(grid):
+    '''
+    return: length of a step along each of the grid's offsets in the octile
+    metric: 1 sideways, sqrt(2) diagonally
+    '''
+    stencil = np.array(grid.stencil)
+    return np.hypot(stencil[:, 0], stencil[:, 1])
+
+
+def cut_corners(grid, pos):
+    '''
+    which diagonal steps would cut a wall's corner: the two squares beside a
+    diagonal step must both be free of walls
+    ---
+    grid (FloorGrid): the floor
+    pos (ndarray): flat indices the steps start from
+
+    return: bool array, one row per position and one column per offset
+    '''
+    bits = grid.padded.ravel()
+    cut = np.zeros((len(pos), len(grid.stencil)), dtype=bool)
+    for ix, (di, dj) in enumerate(grid.stencil):
+        if di and dj:
+            cut[:, ix] = ((bits[pos + di*(grid.C+2)] | bits[pos + dj])
+                          & BIT['W']) != 0
+    return cut
+
+
+def stepper(grid, octile=False, corners=False):
+    '''
+    neighbours of squares for the incremental repairs
+    ---
+    octile (bool): steps have their octile lengths, rather than all being 1
+    corners (bool): leave out diagonal steps that cut a wall's corner
+
+    return: function of a flat index giving the list of (flat index, length)
+    of the squares one step away
+    '''
+    offsets = grid.offsets.tolist()
+    if not octile:
+        return lambda v: [(v+o, 1) for o in offsets]
+
+    bits = grid.padded.ravel()
+    W = BIT['W']
+    steps = [(o, w, di*(grid.C+2) if corners and di and dj else 0, dj)
+             for o, w, (di, dj) in zip(offsets, step_lengths(grid).tolist(),
+                                       grid.stencil)]
+    return lambda v: [(v+o, w) for o, w, a, b in steps
+                      if not (a and (bits[v+a] | bits[v+b]) & W)]
+
+
+def sweep(grid, sources, passable, start=0, dtype=float, octile=False,
+          corners=False):
+    '''
+    multi-source breadth-first sweep over the floor, one whole frontier at a
+    time
+    ---
+    grid (FloorGrid): the floor
+    sources (array-like): flat indices the sweep starts from, at `start`
+    passable (ndarray): flat bool array, whether the sweep may enter a square
+    start (int): distance assigned to the sources
+    dtype: float type of the distances
+    octile (bool): measure distances in the octile metric
+    corners (bool): with `octile`, never cut a wall's corner diagonally
+
+    return: flat float array of distances, inf where unreached
+    '''
+    if octile:
+        return octile_sweep(grid, sources, passable, start,
+                            corners).astype(dtype, copy=False)
+
+    dist = np.full(grid.padded.size, INF, dtype=dtype)
+    frontier = np.unique(np.asarray(sources, dtype=np.intp))
+    d = start
+    while frontier.size:
+        dist[frontier] = d
+        d += 1
+        nb = (frontier[:, None] + grid.offsets).ravel()
+        nb = nb[passable[nb]]
+        frontier = np.unique(nb[dist[nb] == INF])
+
+    return dist
+
+
+def octile_sweep(grid, sources, passable, start=0, corners=False):
+    '''
+    sweep() in the octile metric. each pass relaxes the steps out of the
+    squares whose distances the last pass lowered, so a square is entered
+    again whenever a shorter way in turns up; a square's first way in has the
+    fewest steps, and on a grid that is nearly always also the shortest, so
+    few squares are entered twice
+
+    return: flat float64 array of distances, inf where unreached
+    '''
+    length = step_lengths(grid)
+    dist = np.full(grid.padded.size, INF)
+    frontier = np.unique(np.asarray(sources, dtype=np.intp))
+    dist[frontier] = start
+    while frontier.size:
+        nb = frontier[:, None] + grid.offsets
+        d = dist[frontier, None] + length
+        ok = passable[nb]
+        if corners:
+            ok &= ~cut_corners(grid, frontier)
+        nb, d = nb[ok], d[ok]
+        shorter = d < dist[nb]
+        nb, d = nb[shorter], d[shorter]
+        np.minimum.at(dist, nb, d)
+        frontier = np.unique(nb)
+
+    return dist
+
+
+def add_source(grid, dist, k, passable, start=0, steps=None):
+    '''
+    repairs a sweep's distances after square `k` became one of its sources.
+    distances can only decrease, so a wavefront from `k` stops as soon as it
+    reaches squares that are already at least as close to another source
+    ---
+    passable (callable): flat index --> bool
+    steps (callable): neighbours of a square (see stepper); default steps of
+                      length 1 to all of them
+
+    return: set of flat indices whose distance changed
+    '''
+    if dist[k] <= start:
+        return set()
+
+    steps = steps or stepper(grid)
+    dist[k] = start
+    changed = {k}
+    q = deque([k])
+    while q:
+        v = q.popleft()
+        for n, w in steps(v):
+            d = dist[v] + w
+            if dist[n] <= d or not passable(n): continue
+            dist[n] = d
+            changed.add(n)
+            q.append(n)
+
+    return changed
+
+
+def remove_square(grid, dist, k, steps=None):
+    '''
+    repairs a sweep's distances after square `k` stopped being passable.
+    distances can only increase, and only for squares all of whose shortest
+    paths went through `k`. those are found level by level from `k`, then
+    re-swept from the unaffected squares bordering them
+    ---
+    steps (callable): neighbours of a square (see stepper); steps of other
+                      lengths than 1 are repaired by remove_weighted()
+
+    return: set of flat indices whose distance changed
+    '''
+    if dist[k] == INF:
+        return set()
+    if steps is not None:
+        return remove_weighted(grid, dist, k, steps)
+
+    offsets = grid.offsets.tolist()
+    lost = {k}
+    d = dist[k]
+    dist[k] = INF
+    level = {n for n in [k+o for o in offsets] if dist[n] == d+1}
+    while level:
+        d += 1
+        nxt = set()
+        for v in level:
+            nbrs = [v+o for o in offsets]
+            # still has a parent one step closer that was not lost?
+            if any(dist[u] == d-1 and u not in lost for u in nbrs):
+                continue
+            lost.add(v)
+            nxt.update(n for n in nbrs if dist[n] == d+1)
+        level = nxt
+
+    lost.discard(k)
+    for v in lost:
+        dist[v] = INF
+
+    heap = []
+    for v in lost:
+        best = min(dist[u] for u in [v+o for o in offsets])
+        if best < INF:
+            heappush(heap, (best+1, v))
+
+    while heap:
+        d, v = heappop(heap)
+        if dist[v] <= d: continue
+        dist[v] = d
+        for n in [v+o for o in offsets]:
+            if n in lost and dist[n] > d+1:
+                heappush(heap, (d+1, n))
+
+    return lost | {k}
+
+
+def remove_weighted(grid, dist, k, steps):
+    '''
+    remove_square() with steps of any length: the squares that lost all
+    their shortest paths are found in order of distance from `k`, so every
+    square is decided after the squares it could be reached through
+    '''
+    def on_path(a, w, b):
+        # a shortest path to b may come from a, a step of length w away
+        return b < INF and abs(a + w - b) <= TOLERANCE * b
+
+    lost = {k}
+    d = float(dist[k])
+    dist[k] = INF
+    heap = [(float(dist[n]), n) for n, w in steps(k) if on_path(d, w, dist[n])]
+    heapify(heap)
+    while heap:
+        d, v = heappop(heap)
+        if v in lost: continue
+        nbrs = steps(v)
+        # still has a parent on a shortest path that was not lost?
+        if any(on_path(dist[u], w, d) and u not in lost for u, w in nbrs):
+            continue
+        lost.add(v)
+        for n, w in nbrs:
+            if n not in lost and on_path(d, w, dist[n]):
+                heappush(heap, (float(dist[n]), n))
+
+    lost.discard(k)
+    for v in lost:
+        dist[v] = INF
+
+    heap = []
+    for v in lost:
+        best = min([dist[u] + w for u, w in steps(v)], default=INF)
+        if best < INF:
+            heappush(heap, (float(best), v))
+
+    while heap:
+        d, v = heappop(heap)
+        if dist[v] <= d: continue
+        dist[v] = d
+        for n, w in steps(v):
+            if n in lost and dist[n] > d+w:
+                heappush(heap, (d+w, n))
+
+    return lost | {k}
+
+
+def exit_passable(bits):
+    return (bits & (BIT['W'] | BIT['F'])) == 0
+
+def door_passable(bits):
+    return (bits & (BIT['W'] | BIT['F'] | BIT['S'])) == 0
+
+def fire_passable(bits):
+    return (bits & BIT['W']) == 0
+
+
+def find_exits(grid):
+    '''
+    finds the exits of a floor: connected runs of safe squares that border
+    walkable (not wall, not safe) squares. safe squares behind walls, like
+    most of a safe border around a building, belong to no exit. bordering and
+    connected mean side by side (not diagonally), whatever the grid's
+    stencil, so two openings in a wall a square apart are two exits
+    ---
+    grid (FloorGrid): the floor
+
+    return: list of exits, each a tuple of the locations of its squares in
+    row-major order; exits are ordered by their first square
+    '''
+    bits = grid.padded.ravel()
+    walkable = grid.inside.ravel() & ((bits & (BIT['W'] | BIT['S'])) == 0)
+    offsets = [di*(grid.C+2) + dj for di, dj in STENCIL4]
+    safe = np.flatnonzero(bits & BIT['S'])
+    edge = safe[walkable[safe[:, None] + offsets].any(axis=1)]
+
+    unseen = set(edge.tolist())
+    exits = []
+    for k in edge.tolist():
+        if k not in unseen: continue
+        unseen.discard(k)
+        run = [k]
+        stack = [k]
+        while stack:
+            v = stack.pop()
+            for n in [v+o for o in offsets]:
+                if n in unseen:
+                    unseen.discard(n)
+                    run.append(n)
+                    stack.append(n)
+        exits.append(tuple(grid.locs_flat(sorted(run))))
+
+    return exits
+
+
+class DistanceField:
+    '''
+    distance fields of a floor, as flat arrays laid out like FloorGrid.padded
+    ---
+    exits (list): the exits, each a tuple of the locations of its squares
+    doors (list): one square standing for each exit (its middle square)
+    exit (ndarray): distance to the nearest safe zone
+    perexit (ndarray): float32, one row per exit, distance to that exit
+    fire (ndarray): distance to the nearest fire
+    load (ndarray): number of people headed for each exit, once rerouted
+    route (ndarray): congestion-weighted cost of each square, once rerouted
+    octile (bool): whether distances are in the octile metric (see sweep)
+    hop (ndarray): int8, the next hop of each square once hops() has been
+                   called: which of the grid's offsets leads to the
+                   neighbour people move to, -1 if there is none
+    ties (ndarray): uint8 bitmask over the grid's offsets of the neighbours
+                    as good as the next hop, for breaking ties at random
+    '''
+    grid = None
+    exits = None
+    doors = None
+    octile = False
+
+    exit = None
+    perexit = None
+    fire = None
+    load = None
+    route = None
+    penalty = None
+    hop = None
+    ties = None
+
+    # attributes this engine provides to the squares of its grid
+    keys = ['distS', 'door', 'distF', 'dist_weight']
+
+    def __init__(self, grid, exits=None, octile=False):
+        '''
+        constructor method
+        ---
+        grid (FloorGrid): the floor
+        exits (list): the exits, each a sequence of locations of safe
+                      squares (default: find_exits(grid)). squares that are
+                      not on this floor are ignored
+        octile (bool): measure distances in the octile metric: diagonal steps
+                       are sqrt(2) long, and routes never cut a wall's corner
+        '''
+        self.grid = grid
+        self.octile = bool(octile)
+        if exits is None:
+            exits = find_exits(grid)
+        self.exits = [tuple(tuple(loc) for loc in exit) for exit in exits]
+        self.doors = [exit[len(exit)//2] if exit else NODOOR
+                      for exit in self.exits]
+
+    def compute(self):
+        '''
+        runs one sweep for the safe zones, one per exit, and one for the fire
+        '''
+        grid = self.grid
+        bits = grid.padded.ravel()
+
+        safe = np.flatnonzero(bits & BIT['S'])
+        fire = np.flatnonzero(bits & BIT['F'])
+
+        # fire goes through walls, so it may cut their corners too
+        octile = self.octile
+        self.exit = sweep(grid, safe, exit_passable(bits), octile=octile,
+                          corners=octile)
+        # routes to an exit never pass through other safe squares
+        passable = door_passable(bits)
+        self.perexit = np.full((len(self.exits), bits.size), INF,
+                               dtype=np.float32)
+        for ix, exit in enumerate(self.exits):
+            cells = [grid.flat(loc) for loc in exit if loc in grid]
+            if cells:
+                self.perexit[ix] = sweep(grid, cells, passable,
+                                         dtype=np.float32, octile=octile,
+                                         corners=octile)
+        self.fire = sweep(grid, fire, fire_passable(bits), octile=octile)
+
+        return self
+
+    def copy(self, grid):
+        '''
+        return: a DistanceField for `grid` (a copy of this one's grid) with
+        copies of these fields, so it can be repaired independently
+        '''
+        field = DistanceField(grid, self.exits, self.octile)
+        field.exit = self.exit.copy()
+        field.perexit = self.perexit.copy()
+        field.fire = self.fire.copy()
+        if self.route is not None:
+            field.load = self.load.copy()
+            field.penalty = self.penalty.copy()
+            field.route = self.route.copy()
+        if self.hop is not None:
+            field.hop = self.hop.copy()
+            field.ties = self.ties.copy()
+        return field
+
+    @property
+    def cost(self):
+        '''
+        the field people move down: the congestion-weighted route once
+        reroute() has been called, otherwise the distance to the nearest safe
+        zone
+        '''
+        return self.exit if self.route is None else self.route
+
+    def reroute(self, pos, queued=None, b=0, rounds=8):
+        '''
+        congestion-aware routing, y = x + b*w: the cost of a square becomes
+        the least, over the exits, of its distance x to the exit plus b times
+        the exit's load w. the load of an exit is the number of people headed
+        for it; people waiting in a bottleneck count twice, since a queue
+        holds up everyone behind it.
+        who is headed where depends on the loads in turn, so the loads are
+        found by successive averages: starting from the last refresh's, each
+        round moves them part of the way towards the loads the current ones
+        lead to. taking the last loads as they are instead would send a crowd
+        back and forth between two exits at every refresh.
+        this costs one pass over the floor per exit, whatever the number of
+        people
+        ---
+        pos (array-like): flat indices of the people still on their way
+        queued (array-like): bool per person, whether they are in a queue
+        b (float): weight of the load, per person
+        rounds (int): rounds of averaging
+
+        return: load of each exit
+        '''
+        E = len(self.exits)
+        pos = np.asarray(pos, dtype=np.intp)
+        queued = (np.zeros(pos.size, dtype=bool) if queued is None
+                  else np.asarray(queued, dtype=bool))
+
+        load = np.zeros(E)
+        if not E:
+            return load
+        if pos.size:
+            dists = self.perexit[:, pos]
+            # nobody is headed for an exit they cannot reach
+            reachable = np.isfinite(dists.min(axis=0))
+            dists, queued = dists[:, reachable], queued[reachable]
+            weight = 1. + queued
+
+            def headed_for(load):
+                headed = (dists + b*load[:, None]).argmin(axis=0)
+                return np.bincount(headed, weight, minlength=E)
+
+            load = self.load if self.load is not None else headed_for(load)
+            for k in range(rounds):
+                load = load + (headed_for(load) - load) / (k + 2)
+
+        self.load = load
+        self.penalty = b * load
+        route = np.full(self.exit.size, INF)
+        for row, penalty in zip(self.perexit, self.penalty):
+            np.minimum(route, row + penalty, out=route)
+        self.route = route
+        if self.hop is not None:
+            self.hops()
+        return load
+
+    def hops(self, ix=None):
+        '''
+        the next-hop table (a flow field): for each square, the neighbour of
+        least cost people may step to, as Person.move picks it: not burning,
+        not a wall, and in the octile metric not past a wall's corner. ties
+        go to the first of the grid's offsets. once built, ignite() and
+        reroute() keep it up to date, so a move is one lookup
+        ---
+        ix (array-like): flat indices of the squares to refresh (default:
+                         build the table for the whole floor)
+
+        return: the table, self.hop
+        '''
+        grid = self.grid
+        bits = grid.padded.ravel()
+        cost = self.cost
+        if ix is None or self.hop is None:
+            self.hop = np.full(bits.size, -1, dtype=np.int8)
+            self.ties = np.zeros(bits.size, dtype=np.uint8)
+            ix = np.flatnonzero(grid.inside.ravel())
+        ix = np.asarray(ix, dtype=np.intp)
+
+        # a chunk at a time, to bound the memory of the neighbour arrays
+        chunk = 1 << 16
+        for start in range(0, ix.size, chunk):
+            pos = ix[start:start+chunk]
+            nbrs = pos[:, None] + grid.offsets
+            valid = (bits[nbrs] & (BIT['F'] | BIT['W'])) == 0
+            if self.octile:
+                valid &= ~cut_corners(grid, pos)
+            # squares no exit can be reached from still beat fire and walls
+            ncost = np.where(valid, np.minimum(cost[nbrs], 1e300), INF)
+            best = ncost.argmin(axis=1)
+            lowest = ncost[np.arange(pos.size), best]
+            self.hop[pos] = np.where(valid.any(axis=1), best, -1)
+            self.ties[pos] = np.packbits(valid & (ncost == lowest[:, None]),
+                                         axis=1, bitorder='little')[:, 0]
+        return self.hop
+
+    def step(self, k, u=None):
+        '''
+        where people on the square at flat index `k` move next
+        ---
+        u (float): uniform variate in [0,1) picking among equally good
+                   neighbours; None takes the next hop
+
+        return: index into the grid's offsets, -1 if there is no way on
+        '''
+        if self.hop is None:
+            self.hops()
+        ix = int(self.hop[k])
+        if u is None or ix < 0:
+            return ix
+        ties = [i for i in range(len(self.grid.offsets))
+                if self.ties[k] >> i & 1]
+        return ties[int(u * len(ties))]
+
+    def ignite(self, loc):
+        '''
+        repairs the fields after the square at `loc` caught fire (its 'F'
+        attribute must already be set), touching only the squares whose
+        distances the new fire can change. gives the same result as
+        compute(), without sweeping the whole floor again
+        ---
+        return: set of locations whose distances changed
+        '''
+        grid = self.grid
+        bits = grid.padded.ravel()
+        k = grid.flat(loc)
+
+        steps = None
+        if self.octile:
+            steps = stepper(grid, octile=True, corners=True)
+        changed = add_source(grid, self.fire, k,
+                             lambda n: fire_passable(bits[n]),
+                             steps=stepper(grid, self.octile))
+        moved = remove_square(grid, self.exit, k, steps)
+        changed |= moved
+        rerouted = set()
+        for field in self.perexit:
+            rerouted |= remove_square(grid, field, k, steps)
+        changed |= rerouted
+
+        if self.route is not None:
+            moved = rerouted
+            if rerouted:
+                ix = np.fromiter(rerouted, dtype=np.intp)
+                self.route[ix] = (self.perexit[:, ix]
+                                  + self.penalty[:, None]).min(axis=0)
+
+        if self.hop is not None:
+            # the next hops that can change are those of the neighbours of
+            # the new fire and of the squares whose cost changed
+            ix = np.fromiter(moved | {k}, dtype=np.intp)
+            ix = np.unique((ix[:, None] + grid.offsets).ravel())
+            self.hops(ix[grid.inside.ravel()[ix]])
+
+        return {grid.loc(n) for n in changed}
+
+    def annotate(self):
+        '''
+        attaches the fields to the grid, so its squares provide the 'distS',
+        'door', 'distF' and 'dist_weight' attributes
+        '''
+        self.grid.distances = self
+        return self.grid
+
+    def square(self, loc, key):
+        '''
+        one distance attribute of the square at `loc`
+        ---
+        distS (list): distance to each exit, indexed like self.exits
+        door (list): squares standing for the exits (see self.doors),
+                     nearest first, padded with (-1,-1)
+        distF (float): distance to the nearest fire
+        dist_weight (float): cost of moving on from here (see self.cost)
+        '''
+        grid = self.grid
+        k = grid.flat(loc)
+        n = len(self.doors)
+
+        if key == 'distF':
+            return self.fire[k].item()
+        if key == 'dist_weight':
+            return self.cost[k].item()
+
+        bits = grid.padded.flat[k]
+        if bits & BIT['S']:
+            return [0] * n if key == 'distS' else [NODOOR] * n
+
+        dists = self.perexit[:, k].tolist()
+        if key == 'distS':
+            return dists
+        if bits & BIT['W']:
+            return [NODOOR] * n
+        order = sorted((ix for ix in range(n) if dists[ix] < INF),
+                       key=dists.__getitem__)
+        return [self.doors[ix] for ix in order] + [NODOOR] * (n-len(order))
+
+
+def check(grid, exits=None, every=1, fire_mover=None, octile=False):
+    '''
+    spreads fire over the whole floor one square at a time, repairing the
+    fields with ignite() and comparing them against a full recompute
+    ---
+    every (int): compare after every this many ignitions (and at the end)
+    fire_mover (callable): picks the next square from a list of candidates
+    octile (bool): check fields in the octile metric, which only match up to
+                   rounding
+
+    return: number of ignitions
+    '''
+    import random
+    fire_mover = fire_mover or random.choice
+
+    def same(a, b):
+        if octile:
+            return np.allclose(a, b, rtol=TOLERANCE, atol=0)
+        return np.array_equal(a, b)
+
+    def compare(n):
+        fresh = DistanceField(grid, exits, octile).compute()
+        for name in ('exit', 'perexit', 'fire'):
+            assert same(getattr(fields, name), getattr(fresh, name)),\
+                'ignition {}: {} field differs from a full recompute'.format(
+                    n, name)
+
+    fields = DistanceField(grid, exits, octile).compute()
+    exits = fields.exits
+    fields.annotate()
+
+    n = 0
+    while True:
+        cands = [m for loc in grid.locs(grid.has('F'))
+                 for m in grid.nbrs(loc)
+                 if grid[m]['S'] == grid[m]['F'] == 0]
+        if not cands: break
+        loc = fire_mover(cands)
+        grid[loc]['F'] = 1
+        fields.ignite(loc)
+        n += 1
+        if n % every == 0:
+            compare(n)
+
+    compare(n)
+    return n
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+    from floorparse import FloorParser
+    import random
+
+    parser = ArgumentParser(description='check incremental distance-field '
+                                        'repair against full recomputes')
+    parser.add_argument('-i', '--input', type=str,
+                        default='in/twoexitbottleneck.txt',
+                        help='input floor plan file')
+    parser.add_argument('-r', '--random_state', type=int, default=8675309,
+                        help='aka. seed (default:8675309)')
+    parser.add_argument('-e', '--every', type=int, default=1,
+                        help='compare after every this many ignitions')
+    parser.add_argument('--octile', action='store_true',
+                        help='check fields in the octile metric')
+    args = parser.parse_args()
+
+    with open(args.input, 'r') as f:
+        grid = FloorParser().parse_file(f)
+
+    exits = find_exits(grid)
+    if not grid.has('F').any():
+        # start a fire next to a random exit
+        exit = random.Random(args.random_state).choice(exits)
+        grid[[n for n in grid.nbrs(exit[0]) if not (grid[n]['S'] or grid[n]['W'])][0]]['F'] = 1
+
+    n = check(grid, exits, args.every,
+              random.Random(args.random_state).choice, args.octile)
+    print('OK: {} exits, {} ignitions, incremental fields match full '
+          'recomputes'.format(len(exits), n))
@@ -25,20 +25,34 @@ except ImportError:
     from randomgen import PCG64, Generator
 
 # local project imports
-from person import Person
+from person import Person, Population
 from bottleneck import Bottleneck
 from floorparse import FloorParser
+from fieldcache import FieldCache
+import floorload
+from frontier import FireFrontier
+from hazard import HazardModel
+from occupancy import Occupancy, PATIENCE
+from profiling import Profiler
+from floorgrid import FloorGrid, BIT
+from vectorized import VectorizedEngine
 #畫圖
 import matplotlib.pyplot as plt
 
-from functools import lru_cache
+from functools import lru_cache, partial
 
 pp = pprint.PrettyPrinter(indent=4).pprint
 
 class FireSim:
     sim = None
     graph = None # dictionary (x,y) --> attributes
+    fields = None # distance fields of the graph (see distfield.py)
+    pristine = None # snapshot of the precomputed graph, for reset()
+    cache = None # FieldCache of precomputed distance fields, if any
+    profiler = None # counters and timers of the run, if any (see profiling.py)
     gui = False
+    plotter = None
+    maxtime = None
     r = None
     c = None
 
@@ -48,165 +62,143 @@ class FireSim:
     nummoving = 0
     numexit = 0
 
-    bottlenecks = dict()
-    fires = set()
-    people = []
+    # per-run state, set up fresh for every instance (and every reset) by
+    # setup() so runs never share it
+    bottlenecks = None # (x,y) --> Bottleneck
+    fires = None # set of burning (x,y)
+    frontier = None # squares fire can spread to (see frontier.py)
+    hazard_model = None # fire, smoke and heat of the floor, if modelled
+    occupancy = None # people on each square, if squares have a capacity
+    people = None
 
-    exit_times = []
-    exit_loc = []
+    exit_loc = None
     avg_exit = 0 # tracks sum first, then we divide
 
+    # exits of the floor, each a tuple of the locations of its safe squares;
+    # None finds them on the floor (see distfield.find_exits)
+    exits = None
+    # most people a square holds (see occupancy.py); None: any number
+    cell_capacity = None
+
     def __init__(self, input,
                  strategy_generator=lambda: random.uniform(.5, 1.),
                  rate_generator=lambda: abs(random.normalvariate(1, .5)),
-                 person_mover=random.uniform, fire_mover=random.sample,
-                 fire_rate=2, bottleneck_delay=1, animation_delay=.1,
-                 verbose=False,b=.1,
+                 person_mover=random.uniform, fire_mover=random.choice,
+                 fire_rate=2, bottleneck_delay=1, bottleneck_capacity=1,
+                 animation_delay=.1,
+                 verbose=False,b=.1, cache=None, reroute=None, hazard=None,
+                 hazard_generator=numpy.random.random, neighbours=None,
+                 octile=False, profiler=None, random_ties=False,
+                 cell_capacity=None,
                  **kwargs,):
         
         '''
         constructor method
         ---
-        graph (dict): a representation of the floor plan as per our
-                      specification
+        input (str or FloorGrid): floor plan file (txt, .txt.pkl, or binary
+                                  floor file), or an already parsed (and
+                                  possibly precomputed) floor, which is
+                                  copied so the original can be reused
         n (int): number of people in the simulation
+        cache (FieldCache): where to look up (and store) the precomputed
+                            distance fields of the floor
+        bottleneck_delay (float): time between departures from a bottleneck
+        bottleneck_capacity (int or dict): people let through a bottleneck
+                                           per departure; a dict maps the
+                                           locations of bottlenecks to their
+                                           capacity (1 if left out)
+        b (float): weight of congestion in routing, y = x + bw
+        reroute (float): refresh the congestion-aware routing this often (in
+                         simulated time); None: everyone heads for the
+                         nearest safe zone
+        hazard (float): advance fire, smoke and heat over the whole floor
+                        every this often (see hazard.py), instead of setting
+                        one square on fire at a time; None: one at a time
+        hazard_generator (callable): uniform variates of a given shape, for
+                                     the hazard model
+        neighbours (int): squares people and fire can move to from a square,
+                          4 (sideways) or 8 (diagonals too); None: as the
+                          floor was saved (8 for txt floors)
+        octile (bool): diagonal steps are sqrt(2) long, in the distance
+                       fields and in the time people take to make them, and
+                       people never cut a wall's corner (see distfield.py);
+                       False: every step is 1 long
+        profiler (Profiler): counts and times calls of the hot methods, and
+                             the events scheduled (see profiling.py)
+        random_ties (bool): people pick among equally good neighbours with
+                            person_mover; False: the first of them (see
+                            DistanceField.hops)
+        cell_capacity (int): most people a square holds; people whose next
+                             square is full step around it if they can get
+                             closer to safety, or wait (see occupancy.py).
+                             None: any number
         '''     
-        self.sim = simulus.simulator()
         self.parser = FloorParser() 
         self.animation_delay = animation_delay
         self.verbose = verbose
 
-        with open(input, 'r') as f:
-            self.graph = self.parser.parse(f.read())
+        if isinstance(input, FloorGrid):
+            self.graph = input.copy()
+        else:
+            self.graph = floorload.load(input, neighbours)
+        if neighbours and self.graph.stencil != floorload.stencil(neighbours):
+            self.graph = FloorGrid(self.graph.mask,
+                                   floorload.stencil(neighbours))
 
         self.strategy_generator = strategy_generator
         self.rate_generator = rate_generator
         self.person_mover = person_mover
         self.fire_mover = fire_mover
+        self.hazard_generator = hazard_generator
         
         self.fire_rate = fire_rate
         self.bottleneck_delay = bottleneck_delay
+        self.bottleneck_capacity = bottleneck_capacity
         self.kwargs = kwargs
         self.b = b
+        self.cache = cache
+        self.reroute = reroute
+        self.hazard = hazard
+        self.octile = octile
+        self.profiler = profiler
+        self.random_ties = random_ties
+        self.cell_capacity = cell_capacity
+        if profiler is not None:
+            profiler.instrument(self)
 
+        self.precompute()
+        self.pristine = self.graph.copy()
         self.setup()
 
-    def whichdoor(loc):
-        if loc == (42,1):
-            return 0
-        elif loc == (92,14):
-            return 1      
-        elif loc == (92,62):
-            return 2
-        elif loc == (39,75):
-            return 3
+    def reset(self, seed=None, replication=0):
+        '''
+        restores the floor as it was right after precompute, from a snapshot
+        instead of parsing and precomputing it again, and places a new set of
+        people, so one FireSim can run many replications back-to-back
+        ---
+        seed (int): if given, new random streams are set up from this seed
+                    (see make_generators); otherwise the current ones go on
+        replication (int): which independent set of streams of the seed
+        '''
+        if seed is not None:
+            (self.strategy_generator, self.rate_generator,
+             self.person_mover, self.fire_mover,
+             self.hazard_generator) = make_generators(seed, replication)
+
+        self.graph = self.pristine.copy()
+        # point self.fields at the distances copied with the snapshot;
+        # precompute reuses them, it does not compute anything again
+        self.precompute()
+        self.setup()
+        return self
 
     def precompute(self):
         '''
         precompute stats on the graph, e.g. nearest safe zone, nearest fire
         '''
   
-        graph = self.graph
-        
-        def bfs(target, pos, i):
-            def whichdoor(loc):
-                if loc == (42,1):
-                    return 0
-                elif loc == (92,14):
-                    return 1      
-                elif loc == (92,62):
-                    return 2
-                elif loc == (39,75):
-                    return 3
-                
-            distance = [0,0,0,0]
-            door = [(-1,-1),(-1,-1),(-1,-1),(-1,-1)]
-            
-            if graph[pos]['W']: 
-                distance = [float('inf'),float('inf'),float('inf'),float('inf'),float('inf')]
-                return distance, door
-            
-            if graph[pos]['S']:
-                return distance, door
-            
-            q = [(pos, 0, (-1, -1))]
-            visited = set()
-            i_count = 0
-            
-            while q:
-                node, dist, last_loc = q.pop()
-                if node in visited: continue
-                visited.add(node)
-
-                temp=node
-                node = graph[node]
-                if node['W'] or node['F']: continue
-                
-                if node[target]: 
-                    if i_count == i:
-                        door[i_count] = last_loc
-                        distance[whichdoor(last_loc)] = dist  
-                        return distance,door
-                    
-                    else:
-                        door[i_count] = last_loc
-                        distance[whichdoor(last_loc)] = dist
-                        i_count +=1
-                        for n in node['nbrs']:
-                            if graph[n]['S']:
-                                visited.add(n)
-                        for n in graph[last_loc]['nbrs']:
-                            if graph[n]['S']:
-                                visited.add(n)   
-                        continue
-                
-                for n in node['nbrs']:
-                    if n in visited: 
-                        continue
-                    q = [(n, dist+1, temp)] + q
-
-            # unreachable
-            distance = [float('inf'),float('inf'),float('inf'),float('inf'),float('inf')]
-            return distance,door
-        
-        
-        for loc in graph:
-            graph[loc]['distF'] = bfs('F', loc, 3)
-            graph[loc]['distS'],graph[loc]['door'] = bfs('S', loc, 3)
-            #print(loc, "distS", graph[loc]['distS'], "door", graph[loc]['door'],"\n")
-            graph[loc]['density'] = 0
-  
-        '''
-        #計算人口密度
-        for loc in graph:
-            if graph[loc]['P']:
-                graph[graph[loc]['door'][0]]['density'] += 1
-        
-        #將距離加入權重
-        for loc in graph:
-            if graph[loc]['S']:
-                graph[loc]['dist_weight'] = 0
-            else:
-                graph[loc]['dist_weight'] = float('inf')
-                
-            if graph[loc]['door'] != (-1, -1):
-                graph[loc]['dist_weight'] = graph[loc]['distS'] + self.b * graph[graph[loc]['door']]['density']
-        
-        #更新每個點的距離使得每個點的距離和最小鄰居的值只會差1
-        for loc in graph:
-            for loc in graph:
-                if graph[loc]['S'] or graph[loc]['W'] or graph[loc]['F'] or graph[loc]['density'] != 0:
-                  continue
-                min_dist=float('inf')
-                for n in graph[loc]['nbrs']:
-                    if min_dist > graph[n]['dist_weight'] and graph[n]['S']==0:
-                        min_dist = graph[n]['dist_weight']
-                        graph[loc]['door'] = graph[n]['door']
-                        graph[loc]['dist_weight'] = min_dist + 1
-        '''               
-
-        self.graph = dict(graph.items())
-
+        self.fields = floorload.precompute(self.graph, self.exits, self.cache,
+                                           self.octile)
         return self.graph
 
     
@@ -215,37 +207,51 @@ class FireSim:
         once we have the parameters and random variate generation methods from
         __init__, we can proceed to create instances of: people and bottlenecks
         '''
-        self.precompute()
-        
-        
-        av_locs = []
+        self.sim = simulus.simulator()
+        if self.profiler is not None:
+            self.profiler.watch(self.sim)
+        self.numdead = self.numsafe = self.nummoving = self.numexit = 0
+        self.avg_exit = 0
+        self.maxtime = None
+
+        self.bottlenecks = dict()
+        self.fires = set()
+        self.people = []
+        self.exit_loc = []
+
         av_locs_copy = []
-        bottleneck_locs = []
-        fire_locs = []
-
-        r, c = 0, 0
-        for loc, attrs in self.graph.items():
-            r = max(r, loc[0])
-            c = max(c, loc[1])
-            if attrs['P']: av_locs += [loc]
-            elif attrs['B']: bottleneck_locs += [loc]
-            elif attrs['F']: fire_locs += [loc]
+
+        graph = self.graph
+        P, B, F = graph.has('P'), graph.has('B'), graph.has('F')
+        av_locs = graph.locs(P)
+        bottleneck_locs = graph.locs(B)
+        fire_locs = graph.locs(F & ~B & ~P)
         self.numpeople=len(av_locs)
         av_locs_copy = av_locs
         assert len(av_locs) > 0, 'ERR: no people placement locations in input'
-        for i in range(self.numpeople):
-            location=av_locs_copy.pop()
-            p = Person(i, self.rate_generator(),
-                       self.strategy_generator(),
-                       location)
-            self.people += [p]
+        # everyone's attributes go in arrays (see person.Population); they
+        # are drawn person by person, last location first, as they always were
+        draws = [(self.rate_generator(), self.strategy_generator())
+                 for i in range(self.numpeople)]
+        rate, strategy = zip(*draws)
+        self.people = Population(rate, strategy, av_locs_copy[::-1], Person)
 
         for loc in bottleneck_locs:
-            b = Bottleneck(loc)
+            b = Bottleneck(loc, self.capacity(loc))
             self.bottlenecks[loc] = b
         self.fires.update(set(fire_locs))
-
-        self.r, self.c = r+1, c+1
+        self.frontier = FireFrontier(graph, self.fires)
+        self.hazard_model = HazardModel(graph) if self.hazard else None
+        self.occupancy = None
+        if self.cell_capacity is not None:
+            self.occupancy = Occupancy(graph, self.cell_capacity,
+                                       self.people.flat(graph))
+
+        self.r, self.c = graph.shape
+        if self.reroute:
+            self.refresh_route()
+        # where people move next, kept up to date as fire spreads
+        self.fields.hops()
 
         '''
         print(
@@ -260,6 +266,14 @@ class FireSim:
              )
         '''
 
+    def capacity(self, loc):
+        '''
+        return: people let through the bottleneck at `loc` per departure
+        '''
+        if isinstance(self.bottleneck_capacity, dict):
+            return self.bottleneck_capacity.get(loc, 1)
+        return self.bottleneck_capacity
+
     def visualize(self, t):
         '''
         '''
@@ -267,28 +281,55 @@ class FireSim:
             self.plotter.visualize(self.graph, self.people, t)
 
 
-    def update_bottlenecks(self):
+    def update_bottleneck(self, loc):
         '''
-        handles the bottleneck zones on the grid, where people cannot all pass
-        at once. for simplicity, bottlenecks are treated as queues
+        handles a departure from the bottleneck at `loc`, where people cannot
+        all pass at once. bottlenecks are servers with a queue: a departure is
+        scheduled only while someone is waiting (see Bottleneck), so idle
+        bottlenecks cost nothing
         '''
+        if self.maxtime and self.sim.now >= self.maxtime:
+            return
 
-        for key in self.bottlenecks:
-            #print(key, self.bottlenecks[key])
-            personLeaving = self.bottlenecks[key].exitBottleNeck()
-            if(personLeaving != None):
-                self.sim.sched(self.update_person, personLeaving.id, offset=0)
+        b = self.bottlenecks[loc]
+        for personLeaving in b.serve():
+            self.sim.sched(self.update_person, personLeaving.id, offset=0)
+        if b.busy:
+            self.sim.sched(self.update_bottleneck, loc,
+                           offset=self.bottleneck_delay)
+
+
+
+    def refresh_route(self, pos=None, queued=None):
+        '''
+        recomputes the load on each exit and the congestion-weighted costs
+        people move by (see DistanceField.reroute)
+        ---
+        pos (array-like): flat indices of the people still on their way
+                          (default: from the population)
+        queued (array-like): whether each of them is in a bottleneck queue
+        '''
+        if pos is None:
+            graph = self.graph
+            inqueue = {p.id for b in self.bottlenecks.values()
+                       for p in b.queue}
+            active = numpy.flatnonzero(self.people.active())
+            pos = self.people.flat(graph)[active]
+            queued = numpy.isin(active, list(inqueue))
+        return self.fields.reroute(pos, queued, self.b)
+
+    def update_route(self):
+        '''
+        refreshes the congestion-aware routing every `reroute` time units,
+        while anyone is still on their way
+        '''
+        self.refresh_route()
 
         if self.numsafe + self.numdead >= self.numpeople:
             return
-
         if self.maxtime and self.sim.now >= self.maxtime:
             return
-        else:
-            self.sim.sched(self.update_bottlenecks, 
-                           offset=self.bottleneck_delay)
-
-
+        self.sim.sched(self.update_route, offset=self.reroute)
 
     def update_fire(self):
         '''
@@ -309,31 +350,11 @@ class FireSim:
         if self.maxtime and self.sim.now >= self.maxtime:
             return
 
-        no_fire_nbrs = [] # list, not set because more neighbors = more likely
-        for loc in self.fires:
-            # gets the square at the computed location
-            square = self.graph[loc]
-
-            # returns the full list of nbrs of the square
-            nbrs = [(coords, self.graph[coords]) for coords in square['nbrs']]
-
-            # updates nbrs to exclude safe zones and spaces already on fire
-            no_fire_nbrs += [(loc, attrs) for loc, attrs in nbrs
-                             if attrs['S'] == attrs['F'] == 0]
-            # more likely (twice) to spread to non-wall empty zone
-            no_fire_nbrs += [(loc, attrs) for loc, attrs in nbrs
-                             if attrs['W'] == attrs['S'] == attrs['F'] == 0]
-
-        try:
-            (choice, _) = self.fire_mover(no_fire_nbrs)
-        except ValueError as e:
+        choice = self.spread_fire()
+        if choice is None:
             #print('INFO:', 'fire is everywhere, so stopping fire spread')
             return
 
-        self.graph[choice]['F'] = 1
-        self.fires.add(choice)
-
-        self.precompute()
         rt = self.fire_rate
         self.sim.sched(self.update_fire,
                        offset=len(self.graph)/max(1, len(self.fires))**rt)
@@ -343,6 +364,145 @@ class FireSim:
         return choice
 
 
+    def update_hazard(self):
+        '''
+        advances the fire, smoke and heat of the whole floor by one tick of
+        the hazard model, every `hazard` units of time, until all the people
+        have stopped moving
+        '''
+        if self.numsafe + self.numdead >= self.numpeople:
+            return
+        if self.maxtime and self.sim.now >= self.maxtime:
+            return
+
+        self.hazard_step()
+        self.sim.sched(self.update_hazard, offset=self.hazard)
+        self.visualize(self.animation_delay*self.hazard)
+
+
+    def hazard_step(self):
+        '''
+        one tick of the hazard model (see HazardModel.step), then sets the
+        squares it ignited on fire one at a time, repairing the distance
+        fields after each. this is the scheduling-free part of
+        update_hazard, shared by both engines
+        ---
+        return: list of locations that caught fire
+        '''
+        graph = self.graph
+        ignited = graph.locs_flat(self.hazard_model.step(
+            self.hazard, self.hazard_generator))
+        for loc in ignited:
+            graph[loc]['F'] = 1
+            self.fires.add(loc)
+            self.frontier.ignite(loc)
+            self.fields.ignite(loc)
+            if self.gui:
+                self.plotter.ignite(loc)
+        return ignited
+
+
+    def spread_fire(self):
+        '''
+        sets one more square on fire, picked by fire_mover among the
+        neighbours of the squares already burning (see update_fire), and
+        repairs the distance fields. this is the scheduling-free part of
+        update_fire, shared by both engines. the candidates are kept in
+        self.frontier as fires start, rather than gathered from every fire
+        ---
+        return: location that caught fire, or None if fire is everywhere
+        '''
+        # every neighbour of every fire, once per burning neighbour (more
+        # neighbors = more likely), twice if it is not a wall
+        try:
+            # any mover that picks from a sequence works; the frontier's items
+            # are plain (x,y), though numpy's choice() returns them as arrays
+            choice = tuple(int(x) for x in self.fire_mover(self.frontier))
+        except (ValueError, IndexError) as e:
+            return None
+
+        self.graph[choice]['F'] = 1
+        self.fires.add(choice)
+        self.frontier.ignite(choice)
+        if self.gui:
+            self.plotter.ignite(choice)
+
+        # only repair the distances the new fire can affect
+        self.fields.ignite(choice)
+
+        return choice
+
+
+    def next_hop(self, p):
+        '''
+        moves a person where Person.move would, by looking up the square's
+        next hop (see DistanceField.hops) instead of comparing its neighbours
+        ---
+        p (Person): the person
+
+        return: the location moved to, the person's own if they wait for
+        room, None if there is no way on
+        '''
+        grid = self.graph
+        k = grid.flat(p.loc)
+        ix = self.fields.step(k, self.person_mover() if self.random_ties
+                                 else None)
+        if ix < 0:
+            return None
+        n = k + int(grid.offsets[ix])
+        if self.occupancy is not None and self.occupancy.full(n):
+            # the square is full: step around it, or wait for room on it
+            ix = self.occupancy.detour(grid, self.fields, k)
+            if ix < 0:
+                self.occupancy.wait(p.id, [n])
+                return p.loc
+            n = k + int(grid.offsets[ix])
+        return p.goto(grid.loc(n), bool(grid.padded.flat[n] & BIT['S']))
+
+    def cuts_corner(self, loc, target):
+        '''
+        return: whether the step from `loc` to `target` is diagonal and
+        squeezes past the corner of a wall
+        '''
+        (i, j), (x, y) = loc, target
+        if i == x or j == y:
+            return False
+        return bool(self.graph[(x, j)]['W'] or self.graph[(i, y)]['W'])
+
+    def step_length(self, loc, target):
+        '''
+        return: length of the step from `loc` to `target`: sqrt(2) for a
+        diagonal step in the octile metric, otherwise 1
+        '''
+        if not self.octile:
+            return 1
+        (i, j), (x, y) = loc, target
+        return ((x-i)**2 + (y-j)**2) ** .5
+
+    def vacate(self, loc):
+        '''
+        takes a person who left the floor, safe or dead, off the square at
+        `loc`, if squares have a capacity
+        '''
+        if self.occupancy is not None:
+            k = self.graph.flat(loc)
+            self.occupancy.leave(k)
+            self.wake(k)
+
+    def wake(self, k):
+        '''
+        someone made room on the square at flat index `k`: the first person
+        waiting for it looks again a step's time later (see occupancy.py),
+        unless they were about to anyway
+        '''
+        woken = self.occupancy.wake(k)
+        if woken is not None:
+            i, event = woken
+            t = self.sim.now + 1 / self.people[i].rate
+            if t < event.time:
+                self.sim.resched(event, until=t)
+
+
     def update_person(self, person_ix):
         '''
         handles scheduling an update for each person, by calling move() on them.
@@ -353,18 +513,27 @@ class FireSim:
             return
 
         p = self.people[person_ix]
-        if self.graph[p.loc]['F'] or not p.alive:
+        # people are views of the population's arrays: read them once
+        loc = p.loc
+        if self.occupancy is not None:
+            since = self.occupancy.stop(person_ix)
+            if since is not None and self.hazard_model is not None:
+                # smoke and heat harm people while they wait too
+                p.dose += (self.hazard_model.harm.flat[self.graph.flat(loc)]
+                           * (self.sim.now - since))
+        if self.graph[loc]['F'] or not p.alive or p.dose >= 1:
             p.alive = False
+            self.vacate(loc)
             self.numdead += 1
             if self.verbose:
                 print('{:>6.2f}\tPerson {:>3} at {} could not make it'.format(
                                                                   self.sim.now,
-                                                                  p.id, p.loc))
+                                                                  p.id, loc))
             return
         if p.safe:
             self.numsafe += 1
+            self.vacate(loc)
             p.exit_time = self.sim.now
-            self.exit_times += [p.exit_time]
             #self.avg_exit += p.exit_time
             self.avg_exit = p.exit_time
             #print(self.sim.now, "\n")
@@ -373,36 +542,75 @@ class FireSim:
                                                                p.id))
             return
 
-        loc = p.loc
-        square = self.graph[loc]
-        nbrs = [(coords, self.graph[coords]) for coords in square['nbrs']]
-
-        target = p.move(nbrs)
+        if type(p).move is Person.move:
+            # the default strategy is a lookup
+            target = self.next_hop(p)
+        else:
+            square = self.graph[loc]
+            nbrs = [(coords, self.graph[coords]) for coords in square['nbrs']]
+            if self.octile:
+                # no squeezing diagonally past a wall's corner
+                nbrs = [(coords, attrs) for coords, attrs in nbrs
+                        if not self.cuts_corner(loc, coords)]
+            full = []
+            if self.occupancy is not None:
+                # full squares are out of reach for now
+                full = [self.graph.flat(coords) for coords, attrs in nbrs
+                        if not (attrs['F'] or attrs['W'])
+                        and self.occupancy.full(self.graph.flat(coords))]
+                nbrs = [(coords, attrs) for coords, attrs in nbrs
+                        if self.graph.flat(coords) not in full]
+            target = p.move(nbrs)
+            if not target and full:
+                # nowhere to go but full squares: wait for room on them
+                self.occupancy.wait(person_ix, full)
+                target = loc
         if not target:
             p.alive = False
+            self.vacate(loc)
             self.numdead += 1
             if self.verbose:
                 print('{:>6.2f}\tPerson {:>3} at {} got trapped in fire'.format(
                                                                    self.sim.now,
-                                                                   p.id, p.loc))
+                                                                   p.id, loc))
+            return
+        if target == loc:
+            # waiting for room, which wakes them (see wake), or looking
+            # again after a while
+            event = self.sim.sched(self.update_person, person_ix,
+                                   offset=PATIENCE / p.rate)
+            self.occupancy.retry(person_ix, self.sim.now, event)
             return
+        if self.occupancy is not None:
+            k = self.graph.flat(loc)
+            self.occupancy.move(k, self.graph.flat(target))
+            self.wake(k)
         square = self.graph[target]
         if square['B']:
             b = self.bottlenecks[target]
-            b.enterBottleNeck(p)
+            if b.enterBottleNeck(p):
+                self.sim.sched(self.update_bottleneck, target,
+                               offset=self.bottleneck_delay)
         elif square['F']:
             p.alive = False
+            self.vacate(target)
             self.numdead += 1
             return
         else:
-            t = 1/p.rate
+            t = self.step_length(loc, target) / p.rate
+            if self.hazard_model is not None:
+                # smoke slows people down, and smoke and heat harm them for
+                # as long as they take to cross the square
+                k = self.graph.flat(target)
+                t /= self.hazard_model.speed.flat[k]
+                p.dose += self.hazard_model.harm.flat[k] * t
             if self.sim.now + t >= (self.maxtime or float('inf')):
                 if square['S']:
                     self.nummoving += 1
                 else:
                     self.numdead += 1
             else:
-                self.sim.sched(self.update_person, person_ix, offset=1/p.rate)
+                self.sim.sched(self.update_person, person_ix, offset=t)
 
         if (1+person_ix) % int(self.numpeople**.5) == 0:
             self.visualize(t=self.animation_delay/len(self.people)/2)
@@ -412,16 +620,43 @@ class FireSim:
 
 
 
-    def simulate(self, maxtime=None, spread_fire=False, gui=False):
+    def simulate(self, maxtime=None, spread_fire=False, gui=False,
+                 engine='simulus', dt=.1, record=None):
         '''
         sets up initial scheduling and calls the sim.run() method in simulus
+        ---
+        engine (str): 'simulus' schedules one event per person per move;
+                      'vectorized' advances everyone at once in time steps of
+                      dt (see vectorized.py)
+        dt (float): time step of the vectorized engine
+        record (str): draw the frames off-screen and write them to this .mp4
+                      file or image sequence instead of showing them (see
+                      viz.Recorder); stats() writes the last ones
         '''
 
-        self.gui = gui
-        if self.gui: 
+        self.gui = gui or record is not None
+        if record is not None:
+            from viz import Recorder
+            self.plotter = Recorder(record)
+        elif self.gui: 
             from viz import Plotter
             self.plotter = Plotter()
 
+        if engine == 'vectorized':
+            if not spread_fire:
+                print('INFO\t', 'fire won\'t spread around!')
+            self.maxtime = maxtime
+            vectorized = VectorizedEngine(self, dt)
+            if self.profiler is not None:
+                self.profiler.instrument(vectorized,
+                                         self.profiler.engine_methods)
+            vectorized.run(maxtime, spread_fire)
+            if self.profiler is not None:
+                self.profiler.sim_time = vectorized.now
+            return
+        elif engine != 'simulus':
+            raise ValueError('unknown engine: {}'.format(engine))
+
         # set initial movements of all the people
         for i, p in enumerate(self.people):
             loc = tuple(p.loc)
@@ -430,15 +665,20 @@ class FireSim:
             self.sim.sched(self.update_person, i, offset=1/p.rate)
 
         #updates fire initially
-        if spread_fire:
+        if spread_fire and self.hazard:
+            self.sim.sched(self.update_hazard, offset=self.hazard)
+        elif spread_fire:
             self.sim.sched(self.update_fire,
                            offset=1)#len(self.graph)/max(1, len(self.fires)))
         else:
             print('INFO\t', 'fire won\'t spread around!')
-        self.sim.sched(self.update_bottlenecks, offset=self.bottleneck_delay)
+        if self.reroute:
+            self.sim.sched(self.update_route, offset=self.reroute)
 
         self.maxtime = maxtime
         self.sim.run()
+        if self.profiler is not None:
+            self.profiler.sim_time = self.sim.now
 
         #self.avg_exit /= max(self.numsafe, 1)
 
@@ -447,6 +687,9 @@ class FireSim:
         '''
         computes and outputs useful stats about the simulation for nice output
         '''
+        # reductions over the population's arrays (see Population.tally)
+        safe, dead, injured = self.people.tally()
+        exit_times = self.people.exit_times()
         '''
         print('\n\n', '='*79, sep='')
         print('STATS')
@@ -456,19 +699,19 @@ class FireSim:
                   (desc+' ').ljust(30, '.') + (' '+str(obj)).rjust(30, '.'))
 
         printstats('total # people', self.numpeople)
-        printstats('# people safe', self.numsafe)
-        printstats('# people dead', self.numpeople-self.numsafe-self.nummoving)
-        printstats('# people gravely injured', self.nummoving)
+        printstats('# people safe', safe)
+        printstats('# people dead', dead)
+        printstats('# people gravely injured', injured)
         print()
         #printstats('total simulation time', '{:.3f}'.format(self.sim.now))
-        if self.avg_exit:
-            printstats('time to safe', '{:.3f}'.format(self.avg_exit))
+        if exit_times.size:
+            printstats('time to safe', '{:.3f}'.format(exit_times[-1]))
         else:
             printstats('average time to safe', 'NA')
         print()
         '''
-        if self.avg_exit:
-            print('{:.3f}'.format(self.avg_exit))
+        if exit_times.size:
+            print('{:.3f}'.format(exit_times[-1]))
         else:
             print('average time to safe', 'NA')
         self.visualize(5)
@@ -491,6 +734,39 @@ def plot_points(x, y):
     plt.show()
 
 
+def make_generators(seed, replication=0):
+    '''
+    sets up one PCG64 random stream per source of randomness
+    ---
+    seed (int): aka. random_state
+    replication (int): replications of one seed use disjoint PCG64 streams,
+                       so they are independent (replication 0 is the default
+                       single run)
+
+    return: strategy_generator, rate_generator, person_mover, fire_mover,
+            hazard_generator
+    '''
+    streams = [numpy.random.Generator(PCG64(seed, 4*replication + i))
+               for i in range(4)]
+    strat_strm, rate_strm, pax_strm, fire_strm = streams
+
+    strategy_generator = lambda: strat_strm.uniform(.5, 1) # used to pick move
+    rate_generator = lambda: max(.1, abs(rate_strm.normal(1, .1))) # used to
+                                                                   # decide
+                                                                   # strategies
+    #strategy_generator = 0.5
+    #rate_generator = 5
+    person_mover = lambda: pax_strm.uniform() #
+    # picks like fire_strm.choice(a) would, without copying `a` to an array
+    fire_mover = lambda a: a[fire_strm.integers(len(a))]
+    # the hazard model spreads fire instead of fire_mover, so it takes over
+    # the fire stream
+    hazard_generator = lambda shape: fire_strm.random(shape)
+
+    return (strategy_generator, rate_generator, person_mover, fire_mover,
+            hazard_generator)
+
+
 def main():
     '''
     driver method for this file. the firesim class can be used via imports as
@@ -519,42 +795,84 @@ def main():
                         help='rate of spread of fire (this is the exponent)')
     parser.add_argument('-b', '--bottleneck_delay', type=float, default=1,
                         help='how long until the next person may leave the B')
+    parser.add_argument('-c', '--bottleneck_capacity', type=int, default=1,
+                        help='how many people may leave the B at a time')
     parser.add_argument('-a', '--animation_delay', type=float, default=1,
                         help='delay per frame of animated visualization (s)')
     parser.add_argument('-w', '--weight', type=float, default=0,
-                        help='y=x+bw')
+                        help='y=x+bw, only with --reroute')
+    parser.add_argument('-e', '--engine', type=str, default='simulus',
+                        choices=['simulus', 'vectorized'],
+                        help='event engine, or vectorized time steps')
+    parser.add_argument('--dt', type=float, default=.1,
+                        help='time step of the vectorized engine')
+    parser.add_argument('--no_cache', action='store_true',
+                        help='always precompute the distance fields instead '
+                             'of using the on-disk cache')
+    parser.add_argument('--reroute', type=float, default=None,
+                        help='route around crowded exits, weighing them by '
+                             '-w, refreshed this often (default: off)')
+    parser.add_argument('--hazard', type=float, default=None,
+                        help='spread fire, smoke and heat over the whole '
+                             'floor at once, this often (default: one square '
+                             'at a time)')
+    parser.add_argument('--octile', action='store_true',
+                        help='diagonal steps are sqrt(2) long, and never cut '
+                             "a wall's corner (default: every step is 1)")
+    parser.add_argument('--cell_capacity', type=int, default=None,
+                        help='most people a square holds; the others step '
+                             'around it or wait (default: any number)')
+    parser.add_argument('-n', '--neighbours', type=int, default=None,
+                        choices=sorted(floorload.STENCILS),
+                        help='neighbours of a square (default: as the floor '
+                             'was saved, 8 for txt floors)')
+    parser.add_argument('--record', type=str, default=None,
+                        help='record the animation to an .mp4 file or a '
+                             'directory of frames, without a display')
+    parser.add_argument('--profile', type=str, default=None,
+                        help='write calls and times of the hot methods, and '
+                             'events scheduled, to this JSON file')
+    parser.add_argument('--pstats', type=str, default=None,
+                        help='also run under cProfile and write its stats to '
+                             'this file, for python -m pstats')
     args = parser.parse_args()
+    if args.weight and args.reroute is None:
+        parser.error('-w only matters with --reroute')
     # output them as a make-sure-this-is-what-you-meant
     #print('commandline arguments:', args, '\n')
 
     # set up random streams
-    streams = [numpy.random.Generator(PCG64(args.random_state, i)) for i in range(4)]
-    strat_strm, rate_strm, pax_strm, fire_strm = streams
-
-    strategy_generator = lambda: strat_strm.uniform(.5, 1) # used to pick move
-    rate_generator = lambda: max(.1, abs(rate_strm.normal(1, .1))) # used to
-                                                                   # decide
-                                                                   # strategies
-    #strategy_generator = 0.5
-    #rate_generator = 5
-    person_mover = lambda: pax_strm.uniform() #
-    fire_mover = lambda a: fire_strm.choice(a) #
+    (strategy_generator, rate_generator,
+     person_mover, fire_mover,
+     hazard_generator) = make_generators(args.random_state)
 
     #weight = [0, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0]
     #time = [0,0,0,0,0,0,0,0,0,0,0]
     # create an instance of Floor
     #for i in range(2):
         #b = i/10
+    profiler = Profiler() if args.profile or args.pstats else None
     floor = FireSim(args.input,
                     strategy_generator, rate_generator, person_mover,
                     fire_mover, fire_rate=args.fire_rate,
                     bottleneck_delay=args.bottleneck_delay,
-                    animation_delay=args.animation_delay, verbose=args.output, b=args.weight)
+                    bottleneck_capacity=args.bottleneck_capacity,
+                    animation_delay=args.animation_delay, verbose=args.output, b=args.weight,
+                    cache=None if args.no_cache else FieldCache(),
+                    reroute=args.reroute, hazard=args.hazard,
+                    hazard_generator=hazard_generator,
+                    neighbours=args.neighbours, octile=args.octile,
+                    profiler=profiler, cell_capacity=args.cell_capacity)
 
     # floor.visualize(t=5000)
     # call the simulate method to run the actual simulation
-    floor.simulate(maxtime=args.max_time, spread_fire=not args.no_spread_fire,
-                   gui=not args.no_graphical_output)
+    simulate = floor.simulate if profiler is None else \
+        partial(profiler.run, floor.simulate, pstats=args.pstats)
+    simulate(maxtime=args.max_time, spread_fire=not args.no_spread_fire,
+             gui=not args.no_graphical_output, engine=args.engine,
+             dt=args.dt, record=args.record)
+    if args.profile:
+        profiler.dump(args.profile)
 
     floor.stats()
     del floor
@@ -0,0 +1,179 @@
+'''
+This file accompanies other files in the evacuation simulation project.
+
+In this file we define 'FieldCache', an on-disk cache of precomputed distance
+fields, so that simulating the same floor many times (e.g. with only the seed
+changed) precomputes it once. entries are binary floor files (see
+floorfile.py) named by a hash of everything the fields depend on: the walls,
+safe zones and fires of the floor, its stencil, the exits and the metric.
+editing the floor changes the hash, so stale entries are never used; they
+just age out. the least recently used entries are evicted once the cache
+outgrows its cap.
+'''
+
+import hashlib
+import os
+
+import numpy as np
+
+from floorgrid import BIT
+from distfield import DistanceField, find_exits
+import floorfile
+
+# the only attributes the distance fields depend on
+FIELD_BITS = BIT['W'] | BIT['S'] | BIT['F']
+
+DEFAULT_DIR = os.environ.get('EVACUATE_CACHE', os.path.join(
+    os.path.expanduser('~'), '.cache', 'evacuate'))
+
+
+def floorhash(grid, exits, octile=False):
+    '''
+    return: hex digest identifying the distance fields of `grid` and `exits`,
+    in the octile metric or not
+    '''
+    h = hashlib.sha256()
+    h.update(b'%d %d %d|' % (floorfile.VERSION, grid.R, grid.C))
+    if octile:
+        h.update(b'octile|')
+    h.update(repr((grid.stencil, exits)).encode())
+    h.update(np.ascontiguousarray(grid.padded & FIELD_BITS).tobytes())
+    return h.hexdigest()
+
+
+class FieldCache:
+    '''
+    directory of cached distance fields
+    ---
+    directory (str): where entries are kept
+    maxbytes (int): total size of the entries beyond which the least recently
+                    used ones are evicted
+    hits, misses (int): lookups so far
+    '''
+    directory = None
+    maxbytes = None
+    hits = misses = 0
+
+    suffix = '.floor'
+
+    def __init__(self, directory=DEFAULT_DIR, maxbytes=256 << 20):
+        '''
+        constructor method
+        ---
+        directory (str): where to keep entries (default: $EVACUATE_CACHE,
+                         or ~/.cache/evacuate)
+        maxbytes (int): size cap, in bytes (default: 256MiB)
+        '''
+        self.directory = directory
+        self.maxbytes = maxbytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def get(self, grid, exits, octile=False):
+        '''
+        looks up the distance fields of a floor
+        ---
+        exits (list): as in DistanceField.exits
+        octile (bool): as in DistanceField.octile
+
+        return: DistanceField of `grid`, or None if it is not cached
+        '''
+        path = self.path(floorhash(grid, exits, octile))
+        try:
+            cached = floorfile.load(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        fields = cached.distances
+        if fields is None or cached.shape != grid.shape \
+                or fields.octile != bool(octile):
+            self.misses += 1
+            return None
+
+        # mark as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self.hits += 1
+        fields.grid = grid
+        return fields
+
+    def put(self, fields):
+        '''
+        stores the distance fields of a floor, then evicts the least recently
+        used entries while the cache is over its cap
+        ---
+        fields (DistanceField): computed fields, and the floor they are of
+        '''
+        grid = fields.grid
+        key = floorhash(grid, fields.exits, fields.octile)
+        # write to a temporary name and rename, so readers never see part of
+        # an entry
+        tmp = self.path('{}.{}.tmp'.format(key, os.getpid()))
+        distances, grid.distances = grid.distances, fields
+        try:
+            floorfile.save(tmp, grid)
+        finally:
+            grid.distances = distances
+        os.replace(tmp, self.path(key))
+        self.evict()
+
+    def fields(self, grid, exits=None, octile=False):
+        '''
+        return: DistanceField of `grid` (not yet annotated), from the cache
+        if it is there, otherwise computed and added to the cache
+        ---
+        exits (list): the floor's exits (default: find_exits(grid))
+        octile (bool): distances in the octile metric
+        '''
+        if exits is None:
+            exits = find_exits(grid)
+        exits = DistanceField(grid, exits).exits
+        fields = self.get(grid, exits, octile)
+        if fields is None:
+            fields = DistanceField(grid, exits, octile).compute()
+            try:
+                self.put(fields)
+            except OSError:
+                # a read-only or full cache only costs us the speedup
+                pass
+        return fields
+
+    def entries(self):
+        '''
+        return: list of (last used, size, path) of the entries, oldest first
+        '''
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(self.suffix):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        return sorted(entries)
+
+    def evict(self):
+        '''
+        removes the least recently used entries until the cache fits its cap
+        '''
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.maxbytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+    def clear(self):
+        for _, _, path in self.entries():
+            os.remove(path)
@@ -0,0 +1,232 @@
+'''
+This file accompanies other files in the evacuation simulation project.
+
+In this file we define a binary floor format, which replaces the pickle of the
+dict graph written next to a txt floor. a floor file is a fixed-size header
+followed by sections that are opened with numpy.memmap, so opening even a
+large floor reads no more than the header, and worker processes that open the
+same file share its pages:
+
+    header     magic, version, flags, R, C, and the offset of every section
+    stencil    (di, dj) of each neighbour, int8
+    padded     (R+2)x(C+2) attribute bits (see floorgrid.BIT), border included
+    exitptr    (optional) where each exit's squares start in exitcells, and
+               where the last one ends, int32
+    exitcells  (optional) flat indices in `padded` of the exits' squares, int32
+    exit       (optional) distance fields of distfield.DistanceField,
+    fire                  float64, laid out like `padded`
+    perexit               (float32, one row per exit)
+
+sections start at multiples of ALIGN bytes. converters from the txt format and
+from the old .txt.pkl pickle are provided, also from the command line:
+
+    python floorfile.py in/floorplan1.txt floorplan1.floor --precompute
+'''
+
+import pickle
+import struct
+
+import numpy as np
+
+from floorgrid import FloorGrid, BIT, ATTRS, STENCIL4, STENCIL8
+from floorparse import FloorParser
+from distfield import DistanceField
+
+MAGIC = b'FLOORBIN'
+VERSION = 2
+ALIGN = 64
+
+# flags
+HAS_DISTANCES = 1
+OCTILE = 2 # the distances are in the octile metric (see distfield.py)
+
+# magic, version, flags, R, C, number of stencil offsets, number of exits,
+# number of exit squares, then the offset of every section
+HEADER = struct.Struct('<8sHHIIHII7Q')
+SECTIONS = ('stencil', 'padded', 'exitptr', 'exitcells', 'exit', 'fire',
+            'perexit')
+
+
+def _align(n):
+    return -(-n // ALIGN) * ALIGN
+
+
+def isfloorfile(path):
+    '''
+    return: whether `path` starts like a binary floor file
+    '''
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def save(path, grid):
+    '''
+    writes a FloorGrid to a binary floor file, with its distance fields if
+    they are precomputed
+    ---
+    path (str): output file
+    grid (FloorGrid): the floor
+    '''
+    fields = grid.distances
+    arrays = dict(stencil=np.array(grid.stencil, dtype=np.int8),
+                  padded=np.ascontiguousarray(grid.padded, dtype=np.uint8))
+    nexits = ncells = 0
+    if fields is not None:
+        nexits = len(fields.exits)
+        exitptr = np.zeros(nexits+1, dtype=np.int32)
+        exitptr[1:] = np.cumsum([len(exit) for exit in fields.exits])
+        ncells = int(exitptr[-1])
+        exitcells = np.array([grid.flat(loc) for exit in fields.exits
+                              for loc in exit], dtype=np.int32)
+        arrays.update(exitptr=exitptr, exitcells=exitcells,
+                      exit=np.asarray(fields.exit, dtype=np.float64),
+                      fire=np.asarray(fields.fire, dtype=np.float64),
+                      perexit=np.asarray(fields.perexit, dtype=np.float32))
+    sizes = {name: arr.nbytes for name, arr in arrays.items()}
+
+    offsets = dict.fromkeys(SECTIONS, 0)
+    end = _align(HEADER.size)
+    for name in SECTIONS:
+        if name in sizes:
+            offsets[name] = end
+            end = _align(end + sizes[name])
+
+    flags = 0
+    if fields is not None:
+        flags = HAS_DISTANCES | (OCTILE if fields.octile else 0)
+    header = HEADER.pack(MAGIC, VERSION, flags, grid.R, grid.C,
+                         len(grid.stencil), nexits, ncells,
+                         *[offsets[name] for name in SECTIONS])
+
+    with open(path, 'wb') as out:
+        out.write(header)
+        for name in SECTIONS:
+            if name in arrays:
+                out.seek(offsets[name])
+                out.write(np.ascontiguousarray(arrays[name]).tobytes())
+        out.truncate(end)
+
+
+def load(path, mode='c'):
+    '''
+    opens a binary floor file without reading it: the attribute bits (and
+    distance fields, if present) are memory-mapped
+    ---
+    path (str): input file
+    mode (str): numpy.memmap mode. the default, 'c', is copy-on-write:
+                pages are shared until a simulation writes to them, and
+                writes never reach the file. 'r+' writes through
+
+    return: FloorGrid, annotated with its DistanceField if the file has one
+    '''
+    with open(path, 'rb') as f:
+        head = f.read(HEADER.size)
+    if len(head) < HEADER.size or head[:len(MAGIC)] != MAGIC:
+        raise ValueError('{} is not a binary floor file'.format(path))
+    (_, version, flags, R, C, nstencil, nexits, ncells,
+     *offsets) = HEADER.unpack(head)
+    if version != VERSION:
+        raise ValueError('{} is a version {} floor file, expected version '
+                         '{}'.format(path, version, VERSION))
+    offsets = dict(zip(SECTIONS, offsets))
+    P = (R+2) * (C+2)
+
+    def section(name, dtype, shape):
+        if not np.prod(shape):
+            # empty sections cannot be mapped
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode=mode, offset=offsets[name],
+                         shape=shape)
+
+    def read(name, dtype, count):
+        return np.fromfile(path, dtype=dtype, count=count,
+                           offset=offsets[name])
+
+    stencil = read('stencil', np.int8, 2*nstencil).reshape(-1, 2)
+    stencil = tuple((int(di), int(dj)) for di, dj in stencil)
+    grid = FloorGrid.wrap(section('padded', np.uint8, (R+2, C+2)), stencil)
+
+    if flags & HAS_DISTANCES:
+        exitptr = read('exitptr', np.int32, nexits+1).tolist()
+        cells = grid.locs_flat(read('exitcells', np.int32, ncells))
+        exits = [cells[a:b] for a, b in zip(exitptr, exitptr[1:])]
+        fields = DistanceField(grid, exits, flags & OCTILE)
+        fields.exit = section('exit', np.float64, (P,))
+        fields.fire = section('fire', np.float64, (P,))
+        fields.perexit = section('perexit', np.float32, (nexits, P))
+        fields.annotate()
+
+    return grid
+
+
+def fromtxt(path):
+    '''
+    return: FloorGrid of a txt floor (see floorparse.py)
+    '''
+    with open(path, 'r') as f:
+        return FloorParser().parse_file(f)
+
+
+def frompkl(path):
+    '''
+    converts the pickled dict graph floorplan.py used to write. its stencil is
+    taken from the squares' 'nbrs'; its distances are not kept, they are
+    recomputed on demand
+    ---
+    return: FloorGrid
+    '''
+    with open(path, 'rb') as f:
+        graph = pickle.load(f)
+
+    R = 1 + max(i for i, j in graph)
+    C = 1 + max(j for i, j in graph)
+    mask = np.zeros((R, C), dtype=np.uint8)
+    diagonal = False
+    for (i, j), square in graph.items():
+        for att in ATTRS:
+            if square.get(att):
+                mask[i, j] |= BIT[att]
+        diagonal = diagonal or any(n[0] != i and n[1] != j
+                                   for n in square.get('nbrs', ()))
+
+    return FloorGrid(mask, STENCIL8 if diagonal else STENCIL4)
+
+
+def read(path):
+    '''
+    opens a floor in any of the supported formats: binary floor files are
+    memory-mapped, .pkl files are converted, anything else is parsed as txt
+    ---
+    return: FloorGrid
+    '''
+    if isfloorfile(path):
+        return load(path)
+    if path.endswith('.pkl'):
+        return frompkl(path)
+    return fromtxt(path)
+
+
+if __name__ == '__main__':
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description='convert a txt or .txt.pkl floor to '
+                                        'a binary floor file')
+    parser.add_argument('input', type=str, help='txt, .pkl or floor file')
+    parser.add_argument('output', type=str, help='binary floor file')
+    parser.add_argument('--precompute', action='store_true',
+                        help='also store the distance fields')
+    parser.add_argument('--octile', action='store_true',
+                        help='with --precompute, in the octile metric')
+    args = parser.parse_args()
+
+    grid = read(args.input)
+    if args.precompute and (grid.distances is None
+                            or grid.distances.octile != args.octile):
+        DistanceField(grid, octile=args.octile).compute().annotate()
+    save(args.output, grid)
+    print('wrote {} ({}x{}{})'.format(
+        args.output, grid.R, grid.C,
+        ', with distance fields' if grid.distances is not None else ''))
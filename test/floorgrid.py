@@ -0,0 +1,218 @@
+'''
+This file accompanies other files in the evacuation simulation project.
+
+In this file we define a compact, array-backed representation of the floor,
+'FloorGrid'. the attributes of every square are stored as bits of one uint8
+array, and neighbours are implied by a stencil of offsets instead of being
+stored per square. a FloorGrid also behaves like the old dict-of-dicts graph:
+grid[(i,j)] returns a 'Square' view that reads and writes the arrays, so code
+written against the dict keeps working while hot paths use the arrays.
+'''
+
+from collections.abc import Mapping, MutableMapping
+import numpy as np
+
+# attribute vocabulary, one bit each
+ATTRS = 'WSBFNPHM'
+BIT = {att: 1 << k for k, att in enumerate(ATTRS)}
+
+STENCIL4 = ((-1, 0), (1, 0), (0, -1), (0, 1))
+STENCIL8 = STENCIL4 + ((-1, -1), (-1, 1), (1, -1), (1, 1))
+
+
+class FloorGrid(Mapping):
+    '''
+    floor plan of R rows and C cols
+    ---
+    padded (ndarray): (R+2)x(C+2) uint8 attribute bits, with a border of
+                      walls so that flat neighbour offsets never need bounds
+                      checks
+    mask (ndarray): RxC view of the interior of `padded`
+    inside (ndarray): bool array shaped like `padded`, False on the border
+    offsets (ndarray): flat offsets of the neighbours in `padded`
+    fields (dict): name --> RxC array of extra per-square values
+    distances (DistanceField): distance fields, once precomputed
+    '''
+    R = C = 0
+    padded = None
+    mask = None
+    inside = None
+    stencil = None
+    offsets = None
+    fields = None
+    distances = None
+
+    def __init__(self, mask, stencil=STENCIL8):
+        '''
+        constructor method
+        ---
+        mask (array-like): RxC attribute bits (see BIT)
+        stencil (tuple): (di, dj) offsets of a square's neighbours
+        '''
+        mask = np.asarray(mask, dtype=np.uint8)
+        R, C = mask.shape
+        padded = np.full((R+2, C+2), BIT['W'], dtype=np.uint8)
+        padded[1:-1, 1:-1] = mask
+        self._attach(padded, stencil)
+
+    @classmethod
+    def wrap(cls, padded, stencil=STENCIL8):
+        '''
+        a FloorGrid over an existing padded array (e.g. a memmap of a floor
+        file), which is used as is instead of copied
+        ---
+        padded (ndarray): (R+2)x(C+2) uint8 attribute bits, border included
+        '''
+        grid = cls.__new__(cls)
+        grid._attach(padded, stencil)
+        return grid
+
+    def _attach(self, padded, stencil):
+        self.padded = padded
+        self.R, self.C = padded.shape[0]-2, padded.shape[1]-2
+        self.mask = self.padded[1:-1, 1:-1]
+        self.inside = np.zeros(self.padded.shape, dtype=bool)
+        self.inside[1:-1, 1:-1] = True
+        self.stencil = tuple(stencil)
+        self.offsets = np.array([di*(self.C+2) + dj for di, dj in stencil],
+                                dtype=np.intp)
+        self.fields = dict()
+
+    @property
+    def shape(self):
+        return self.R, self.C
+
+    def flat(self, loc):
+        '''
+        index of the square at `loc` in padded.ravel()
+        '''
+        i, j = loc
+        return (i+1)*(self.C+2) + j+1
+
+    def loc(self, k):
+        '''
+        location of the square at index `k` of padded.ravel()
+        '''
+        i, j = divmod(k, self.C+2)
+        return i-1, j-1
+
+    def locs_flat(self, ks):
+        '''
+        return: list of the locations at an array of indices of padded.ravel()
+        '''
+        i, j = np.divmod(np.asarray(ks) - self.C - 3, self.C + 2)
+        return list(zip(i.tolist(), j.tolist()))
+
+    def has(self, att):
+        '''
+        return: RxC bool array, whether each square has attribute `att`
+        '''
+        return (self.mask & BIT[att]) != 0
+
+    def locs(self, region):
+        '''
+        return: list of the locations in a RxC bool array, row by row
+        '''
+        return [tuple(loc) for loc in np.argwhere(region).tolist()]
+
+    def nbrs(self, loc):
+        '''
+        return: set of the locations neighbouring `loc` on this floor
+        '''
+        i, j = loc
+        R, C = self.R, self.C
+        return {(i+di, j+dj) for di, dj in self.stencil
+                if 0 <= i+di < R and 0 <= j+dj < C}
+
+    def copy(self):
+        '''
+        return: a new FloorGrid with a copy of the attribute bits, fields and
+        distance fields, so a precomputed floor can be simulated many times
+        '''
+        grid = FloorGrid(self.mask, self.stencil)
+        grid.fields = {name: arr.copy() for name, arr in self.fields.items()}
+        if self.distances is not None:
+            self.distances.copy(grid).annotate()
+        return grid
+
+    def __getitem__(self, loc):
+        if loc not in self:
+            raise KeyError(loc)
+        return Square(self, loc)
+
+    def __contains__(self, loc):
+        try:
+            i, j = loc
+        except (TypeError, ValueError):
+            return False
+        return 0 <= i < self.R and 0 <= j < self.C
+
+    def __iter__(self):
+        for i in range(self.R):
+            for j in range(self.C):
+                yield i, j
+
+    def __len__(self):
+        return self.R * self.C
+
+    def __repr__(self):
+        return 'FloorGrid({}x{})'.format(self.R, self.C)
+
+
+class Square(MutableMapping):
+    '''
+    dict-like view of one square of a FloorGrid, with the same keys as the
+    squares of the old graph: one int flag per attribute, 'nbrs', the
+    distance attributes once they are precomputed, and any extra fields
+    '''
+    __slots__ = ('grid', 'loc')
+
+    def __init__(self, grid, loc):
+        self.grid = grid
+        self.loc = tuple(loc)
+
+    def __getitem__(self, key):
+        grid = self.grid
+        if key in BIT:
+            return int(bool(grid.mask[self.loc] & BIT[key]))
+        if key == 'nbrs':
+            return grid.nbrs(self.loc)
+        if key in grid.fields:
+            return grid.fields[key][self.loc].item()
+        if grid.distances is not None and key in grid.distances.keys:
+            return grid.distances.square(self.loc, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        grid = self.grid
+        if key in BIT:
+            if value:
+                grid.mask[self.loc] |= BIT[key]
+            else:
+                grid.mask[self.loc] &= ~BIT[key] & 0xff
+        elif key == 'nbrs' or (grid.distances is not None
+                               and key in grid.distances.keys):
+            raise TypeError('{} is derived and cannot be set'.format(key))
+        else:
+            if key not in grid.fields:
+                grid.fields[key] = np.zeros(grid.shape)
+            grid.fields[key][self.loc] = value
+
+    def __delitem__(self, key):
+        raise TypeError('squares of a FloorGrid cannot drop attributes')
+
+    def _keys(self):
+        grid = self.grid
+        keys = ['nbrs', *ATTRS, *grid.fields]
+        if grid.distances is not None:
+            keys += grid.distances.keys
+        return keys
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    def __repr__(self):
+        return repr(dict(self.items()))
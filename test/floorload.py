@@ -0,0 +1,110 @@
+'''
+This file accompanies other files in the evacuation simulation project.
+
+In this file we define the floor-loading core shared by the simulator and the
+floor plan editor (../floorplan.py), so that both read floors, choose
+neighbours and precompute distances the same way, with the same code:
+
+    load        opens a floor in any format (txt, .txt.pkl, binary floor file)
+    parse       parses the txt format, streaming (see floorparse.py)
+    precompute  distance fields of a floor, reused, cached or computed
+    totxt       writes the txt format
+
+all of them keep the full attribute vocabulary (floorgrid.ATTRS), and the
+stencil is a parameter: 4 neighbours (sideways only, as the editor has
+always used) or 8 (diagonals too, as the simulator has).
+'''
+
+import io
+
+from floorgrid import FloorGrid, ATTRS, STENCIL4, STENCIL8
+from floorparse import FloorParser
+from distfield import DistanceField
+import floorfile
+
+STENCILS = {4: STENCIL4, 8: STENCIL8}
+
+# txt of a square, by its attribute bits
+TEXT = ['{: >4}'.format(','.join(reversed(sorted(
+    att for k, att in enumerate(ATTRS) if b & 1 << k)))) for b in range(256)]
+
+
+def stencil(neighbours):
+    '''
+    return: stencil of 4 or 8 neighbours
+    '''
+    try:
+        return STENCILS[neighbours]
+    except KeyError:
+        raise ValueError('neighbours must be one of {}, not {}'.format(
+            sorted(STENCILS), neighbours)) from None
+
+
+def parse(floor, neighbours=8):
+    '''
+    parses a txt floor
+    ---
+    floor (str or file): the text of a floor, or an open txt floor
+
+    return: FloorGrid
+    '''
+    if isinstance(floor, str):
+        floor = io.StringIO(floor)
+    return FloorParser().parse_file(floor, stencil(neighbours))
+
+
+def load(path, neighbours=None):
+    '''
+    opens a floor in any of the supported formats (see floorfile.read)
+    ---
+    neighbours (int): 4 or 8; None keeps the stencil the floor was saved
+                      with (8 for txt floors). a different stencil drops
+                      precomputed distances, which depend on it
+
+    return: FloorGrid
+    '''
+    if neighbours is not None and not floorfile.isfloorfile(path) \
+            and not path.endswith('.pkl'):
+        with open(path, 'r') as f:
+            return parse(f, neighbours)
+
+    grid = floorfile.read(path)
+    if neighbours is not None and grid.stencil != stencil(neighbours):
+        grid = FloorGrid.wrap(grid.padded, stencil(neighbours))
+    return grid
+
+
+def precompute(grid, exits=None, cache=None, octile=False):
+    '''
+    distance fields of a floor, attached to it: the ones it came with if
+    they are for the same exits and metric, otherwise from `cache`,
+    otherwise computed
+    ---
+    exits (list): exits to route to (see DistanceField); None finds them
+    cache (FieldCache): where to look up and store computed fields
+    octile (bool): distances in the octile metric (see distfield.py)
+
+    return: DistanceField
+    '''
+    fields = grid.distances
+    if fields is not None and fields.octile == bool(octile) \
+            and (exits is None or fields.exits == exits):
+        return fields
+    if cache is not None:
+        fields = cache.fields(grid, exits, octile)
+    else:
+        fields = DistanceField(grid, exits, octile).compute()
+    fields.annotate()
+    return fields
+
+
+def totxt(grid, out):
+    '''
+    writes a floor in the txt format
+    ---
+    grid (FloorGrid or ndarray): floor, or RxC array of its attribute bits
+    out (file): where to write it
+    '''
+    mask = grid.mask if isinstance(grid, FloorGrid) else grid
+    for row in mask.tolist():
+        print(';'.join([TEXT[b] for b in row]), file=out)
@@ -1,50 +1,110 @@
 #!/usr/bin/env python3
 
-from collections import defaultdict
+import io
+
+import numpy as np
+
+from floorgrid import FloorGrid, BIT, ATTRS, STENCIL8
+
+
+class FloorParseError(ValueError):
+    '''
+    a txt floor that is malformed: an unknown attribute, or rows of
+    different widths
+    '''
+
 
 class FloorParser:
 
+    # rows decoded into one block of the attribute array at a time
+    chunk_rows = 256
+
     def __init__(self):
         pass
 
     def parse(self, floor):
         '''
-        parses a txt floor
+        parses a txt floor into a FloorGrid (8 neighbours per square, so
+        people can move diagonally)
         '''
-        grid = []
+        return self.parse_file(io.StringIO(floor))
 
-        for row in floor.split('\n'):
-            if not row: continue
+    def parse_file(self, f, stencil=STENCIL8):
+        '''
+        parses a txt floor from a file object, streaming: rows are read one
+        at a time and decoded straight into blocks of attribute bits, so the
+        text of the floor is never all in memory at once, nor any per-square
+        Python objects. each distinct square (e.g. '   W') is decoded and
+        checked once; after that it is a dict lookup
+        ---
+        f (file): open txt floor
+        stencil (tuple): neighbours of a square, as in FloorGrid
+
+        return: FloorGrid
+        raise: FloorParseError on an unknown attribute or a row of the wrong
+               width
+        '''
+        codes = {}
+        blocks = []
+        block = None
+        C = None
+        i = n = 0
+
+        for lineno, row in enumerate(f, 1):
+            row = row.rstrip('\r\n')
+            if not row.strip(): continue
             sqs = row.split(';')
-            rowattrs = [set(sq.strip().split(',')) for sq in sqs]
-            #print(' '.join([list(row)[0] for row in rowattrs]))
-            grid += [rowattrs]
-
 
-        graph = defaultdict(lambda: {'nbrs': set()})
-
-        R, C = len(grid), len(grid[0])
-
-        for i in range(R):
-            for j in range(C):
-                attrs = grid[i][j]
-                graph[(i,j)].update({att:int(att in attrs) for att in 'WSBFNP'})
-
-                for off in {-1, 1}:
-                    if 0 <= i+off < R:
-                        graph[(i,j)]['nbrs'].add((i+off, j))
-                        
-                        #將斜的人加進鄰居 可以往斜的方向走
-                        for off2 in {-1, 1}:
-                            if 0 <= j+off2 < C:
-                                graph[(i,j)]['nbrs'].add((i+off, j+off2))
-
-                    if 0 <= j+off < C:
-                        graph[(i,j)]['nbrs'].add((i, j+off))
-
-        self.graph = dict(graph.items())
+            if C is None:
+                C = len(sqs)
+            elif len(sqs) != C:
+                raise FloorParseError('line {}: {} squares, expected {}'
+                                      .format(lineno, len(sqs), C))
+            try:
+                bits = [codes[sq] for sq in sqs]
+            except KeyError:
+                for j, sq in enumerate(sqs):
+                    if sq not in codes:
+                        codes[sq] = self.decode(sq, lineno, j)
+                bits = [codes[sq] for sq in sqs]
+
+            if block is None or n == len(block):
+                block = np.empty((self.chunk_rows, C), dtype=np.uint8)
+                blocks.append(block)
+                n = 0
+            block[n] = bits
+            n += 1
+            i += 1
+
+        if not i:
+            raise FloorParseError('empty floor')
+
+        # the rows go straight into the padded array of the grid
+        padded = np.full((i+2, C+2), BIT['W'], dtype=np.uint8)
+        for k, block in enumerate(blocks):
+            rows = block[:min(self.chunk_rows, i - k*self.chunk_rows)]
+            padded[1 + k*self.chunk_rows:1 + k*self.chunk_rows + len(rows),
+                   1:-1] = rows
+
+        self.graph = FloorGrid.wrap(padded, stencil)
         return self.graph
 
+    def decode(self, sq, lineno=None, col=None):
+        '''
+        return: attribute bits of one square of the txt format, e.g. ' W,F'
+        raise: FloorParseError if it has an unknown attribute
+        '''
+        bits = 0
+        for att in sq.strip().split(','):
+            if not att:
+                continue
+            if att not in BIT:
+                raise FloorParseError(
+                    'line {}, square {}: unknown attribute {!r} (expected '
+                    'one of {})'.format(lineno, col, att, ', '.join(ATTRS)))
+            bits |= BIT[att]
+        return bits
+
 
     def tostr(self, graph):
         '''
@@ -60,7 +120,7 @@ class FloorParser:
             for c_ in range(c):
                 sq = graph[(r_, c_)]
                 # this =
-                att = ','.join([a for a in sq if a in 'BNSFWP' and sq[a]])
+                att = ','.join([a for a in sq if a in ATTRS and sq[a]])
                 s += '{:>4}'.format(att)
             s += '\n'
 
@@ -0,0 +1,119 @@
+'''
+This file accompanies other files in the evacuation simulation project.
+
+In this file we define 'FireFrontier', the squares fire can spread to next,
+kept up to date as squares ignite instead of being gathered from every burning
+square each time. a square is a candidate once per burning neighbour, twice
+over if it is not a wall (see FireSim.spread_fire); the frontier stores those
+multiplicities as weights in a Fenwick tree, so it can be updated and sampled
+from in O(log n) time.
+'''
+
+from collections.abc import Sequence
+
+import numpy as np
+
+from floorgrid import BIT
+
+
+class FireFrontier(Sequence):
+    '''
+    the multiset of squares fire can spread to, as a read-only sequence:
+    frontier[i] is the location of the i-th candidate, and len(frontier) is
+    the number of candidates counted with multiplicity. picking a uniformly
+    random index (random.choice does) picks a square with probability
+    proportional to its weight, as choosing from the full list of candidates
+    would
+    ---
+    grid (FloorGrid): the floor
+    weight (list): weight of each square, by flat index in grid.padded
+    tree (list): Fenwick tree over `weight`, 1-based
+    total (int): sum of the weights, the number of candidates
+    '''
+    grid = None
+    weight = None
+    tree = None
+    total = 0
+    top = 0 # highest power of two in the tree, where searches start
+
+    def __init__(self, grid, fires):
+        '''
+        constructor method: weighs every square by its burning neighbours
+        ---
+        grid (FloorGrid): the floor
+        fires (iterable): locations of the squares burning so far
+        '''
+        self.grid = grid
+        bits = grid.padded.ravel()
+
+        fires = np.array([grid.flat(loc) for loc in fires], dtype=np.intp)
+        count = np.zeros(bits.size, dtype=np.int64)
+        np.add.at(count, (fires[:, None] + grid.offsets).ravel(), 1)
+        flammable = grid.inside.ravel() & (bits & (BIT['S'] | BIT['F']) == 0)
+        # more likely (twice) to spread to non-wall empty zone
+        weight = np.where(flammable, count * (2 - (bits & BIT['W'] != 0)), 0)
+
+        # Fenwick tree in O(n): node k covers weights k - lowbit(k) .. k-1
+        n = weight.size
+        cum = np.concatenate([[0], np.cumsum(weight)])
+        k = np.arange(1, n+1)
+        tree = np.zeros(n+1, dtype=np.int64)
+        tree[1:] = cum[k] - cum[k - (k & -k)]
+
+        self.weight = weight.tolist()
+        self.tree = tree.tolist()
+        self.total = int(cum[-1])
+        self.top = 1 << (n.bit_length() - 1)
+
+    def add(self, k, delta):
+        '''
+        changes the weight of the square at flat index `k` by `delta`
+        '''
+        self.weight[k] += delta
+        self.total += delta
+        tree = self.tree
+        k += 1
+        n = len(tree)
+        while k < n:
+            tree[k] += delta
+            k += k & -k
+
+    def ignite(self, loc):
+        '''
+        updates the frontier after the square at `loc` caught fire (its 'F'
+        attribute must already be set): it stops being a candidate, and each
+        of its flammable neighbours gains one more burning neighbour
+        '''
+        grid = self.grid
+        bits = grid.padded.ravel()
+        inside = grid.inside.ravel()
+        k = grid.flat(loc)
+
+        if self.weight[k]:
+            self.add(k, -self.weight[k])
+        for n in (k + grid.offsets).tolist():
+            b = int(bits[n])
+            if inside[n] and not b & (BIT['S'] | BIT['F']):
+                self.add(n, 1 if b & BIT['W'] else 2)
+
+    def __len__(self):
+        return self.total
+
+    def __getitem__(self, i):
+        '''
+        location of the i-th candidate, counting each square as many times
+        as its weight, in flat index order
+        '''
+        if not 0 <= i < self.total:
+            raise IndexError('frontier index out of range')
+        tree = self.tree
+        n = len(tree)
+        # walk down the tree to the last node whose prefix sum is <= i
+        k = 0
+        step = self.top
+        while step:
+            if k + step < n and tree[k + step] <= i:
+                k += step
+                i -= tree[k]
+            step >>= 1
+        return self.grid.loc(k)
@@ -0,0 +1,151 @@
+'''
+This file accompanies other files in the evacuation simulation project.
+
+In this file we define 'HazardModel', a grid-wide alternative to spreading
+fire one square at a time (FireSim.update_fire). fire, smoke and heat are
+arrays over the whole floor, advanced together every tick as a cellular
+automaton: smoke and heat are given off by burning squares and diffuse to
+their neighbours, and every square that is not burning catches fire with a
+probability that grows with its burning neighbours and its heat. walls
+attenuate all three, and the hazard classes of floorplan.py make squares
+more flammable: 'H' (hot) most, 'M' (medium) less. the neighbour sums are
+convolutions with the stencil, so a tick costs a few array operations
+whatever the size of the floor. people read the arrays back: smoke slows
+them down, and smoke and heat add up to a dose that kills them.
+'''
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from floorgrid import BIT
+
+
+class HazardModel:
+    '''
+    fire, smoke and heat of a floor. arrays are shaped like grid.padded, so
+    people's flat positions index their .ravel(); the border stays at zero
+    ---
+    grid (FloorGrid): the floor; its 'F' squares are the ones burning
+    smoke (ndarray): smoke concentration of each square, from 0 to 1
+    heat (ndarray): heat of each square, in units of heat_yield
+    speed (ndarray): factor of people's walking speed on each square
+    harm (ndarray): dose people take per unit of time on each square
+    '''
+    grid = None
+    smoke = None
+    heat = None
+    speed = None
+    harm = None
+
+    # ignitions per unit of time per burning neighbour, of a plain square
+    spread = .01
+    # fraction of fire, smoke and heat that walls let through
+    wall = .5
+    # flammability of 'H' and 'M' squares, relative to plain ones
+    hot = 4.
+    medium = 2.
+    # ignitions per unit of time per unit of heat
+    heat_spread = .002
+
+    # smoke and heat given off by a burning square per unit of time, the
+    # fraction of the difference exchanged with each neighbour per unit of
+    # time, and the fraction lost per unit of time. safe zones are open air:
+    # smoke there is gone
+    smoke_yield = .5
+    smoke_diffusion = .1
+    smoke_decay = .02
+    heat_yield = 1.
+    heat_diffusion = .1
+    cooling = .2
+
+    # walking speed falls with smoke, but people still crawl
+    slowdown = .8
+    crawl = .2
+    # time people survive in thick smoke (concentration 1) or in a unit of
+    # heat; a dose of 1 kills
+    smoke_tolerance = 30.
+    heat_tolerance = 20.
+
+    def __init__(self, grid):
+        '''
+        constructor method: a floor with its fires, no smoke and no heat yet
+        ---
+        grid (FloorGrid): the floor
+        '''
+        self.grid = grid
+        bits = grid.padded
+        inside = grid.inside
+
+        self.kernel = np.zeros((3, 3))
+        for di, dj in grid.stencil:
+            self.kernel[di+1, dj+1] = 1
+
+        # how much each square lets through: walls attenuate, the border
+        # lets nothing through
+        self.transmit = np.where(bits & BIT['W'], self.wall, 1.) * inside
+        self.exchange = self.transmit * self.convolve(self.transmit)
+        self.flammability = self.transmit * np.select(
+            [bits & BIT['H'] != 0, bits & BIT['M'] != 0],
+            [self.hot, self.medium], 1.)
+        self.flammability[bits & BIT['S'] != 0] = 0
+        self.vent = inside & (bits & BIT['S'] == 0)
+
+        self.smoke = np.zeros(bits.shape)
+        self.heat = np.zeros(bits.shape)
+        self.speed = np.ones(bits.shape)
+        self.harm = np.zeros(bits.shape)
+
+    def convolve(self, a):
+        '''
+        return: sum of `a` over each square's neighbours, as an array like `a`
+        '''
+        out = np.zeros_like(a)
+        windows = sliding_window_view(a, (3, 3))
+        out[1:-1, 1:-1] = np.einsum('ijkl,kl->ij', windows, self.kernel)
+        return out
+
+    def diffuse(self, a, rate):
+        '''
+        return: `a` after exchanging `rate` of the difference with each
+        neighbour, through the squares' transmittance
+        '''
+        # an exchange of more than 1/(2*neighbours) of the difference per
+        # tick would overshoot
+        rate = min(rate, .5 / len(self.grid.stencil))
+        t = self.transmit
+        return a + rate * t * (self.convolve(t * a) - a * self.exchange)
+
+    def step(self, dt, uniform):
+        '''
+        advances fire, smoke and heat by one tick. squares that catch fire are
+        returned, not marked: FireSim marks them one at a time to repair its
+        distance fields
+        ---
+        dt (float): length of the tick
+        uniform (callable): uniform(shape) returns uniform variates in [0,1)
+
+        return: flat indices of the squares that caught fire, in order
+        '''
+        bits = self.grid.padded
+        burning = ((bits & BIT['F']) != 0) & self.grid.inside
+
+        smoke = self.diffuse(self.smoke, dt * self.smoke_diffusion)
+        smoke += dt * self.smoke_yield * burning
+        smoke *= np.exp(-dt * self.smoke_decay) * self.vent
+        np.clip(smoke, 0, 1, out=smoke)
+        heat = self.diffuse(self.heat, dt * self.heat_diffusion)
+        heat += dt * self.heat_yield * burning
+        heat *= np.exp(-dt * self.cooling)
+
+        # each square catches fire at a rate that grows with its burning
+        # neighbours and its heat
+        rate = self.flammability * (
+            self.spread * self.convolve(self.transmit * burning)
+            + self.heat_spread * heat)
+        p = -np.expm1(-dt * rate)
+        ignited = (p > 0) & ~burning & (uniform(bits.shape) < p)
+
+        self.smoke, self.heat = smoke, heat
+        self.speed = np.maximum(1 - self.slowdown * smoke, self.crawl)
+        self.harm = smoke / self.smoke_tolerance + heat / self.heat_tolerance
+        return np.flatnonzero(ignited)
@@ -0,0 +1,295 @@
+'''
+This file accompanies other files in the evacuation simulation project.
+
+In this file we define 'MonteCarlo', which replicates one scenario of a Sweep
+many times, each replication on its own independent PCG64 streams, and keeps
+running estimates (mean, variance, percentiles, and their confidence
+intervals) of the evacuation time and the death count. replications run in
+parallel and stop as soon as the confidence intervals are as narrow as asked.
+'''
+
+from argparse import ArgumentParser
+from bisect import insort
+from math import ceil, floor, nan, sqrt
+from statistics import NormalDist
+
+from sweep import Sweep
+from fieldcache import FieldCache
+
+
+def zscore(level):
+    '''
+    return: z such that a standard normal lies within +-z with prob. `level`
+    '''
+    return NormalDist().inv_cdf((1 + level) / 2)
+
+
+class RunningStats:
+    '''
+    online estimates of one quantity: mean and variance are updated with
+    Welford's method, and the samples are kept sorted for percentiles
+    ---
+    n (int): number of samples
+    mean (float): sample mean
+    m2 (float): sum of squared deviations from the mean
+    samples (list): the samples, sorted
+    '''
+    n = 0
+    mean = 0.
+    m2 = 0.
+    samples = None
+
+    def __init__(self):
+        self.samples = []
+
+    def add(self, x):
+        self.n += 1
+        d = x - self.mean
+        self.mean += d / self.n
+        self.m2 += d * (x - self.mean)
+        insort(self.samples, x)
+
+    @property
+    def var(self):
+        return self.m2 / (self.n - 1) if self.n > 1 else nan
+
+    @property
+    def std(self):
+        return sqrt(self.var)
+
+    def halfwidth(self, level=.95):
+        '''
+        return: half-width of the normal confidence interval of the mean
+        '''
+        if self.n < 2:
+            return nan
+        return zscore(level) * self.std / sqrt(self.n)
+
+    def percentile(self, q):
+        '''
+        return: the q-th quantile (0 <= q <= 1), interpolating between samples
+        '''
+        if not self.n:
+            return nan
+        x = q * (self.n - 1)
+        lo = floor(x)
+        hi = min(lo + 1, self.n - 1)
+        return self.samples[lo] + (x - lo) * (self.samples[hi] -
+                                              self.samples[lo])
+
+    def percentile_ci(self, q, level=.95):
+        '''
+        distribution-free confidence interval of the q-th quantile: the
+        order statistics (1-based ranks around n*q) that the true quantile
+        lies between, by the normal approximation of the binomial
+        ---
+        return: (low, high), None for a bound whose rank falls outside the
+        samples, i.e. there are too few samples to compute it
+        '''
+        spread = zscore(level) * sqrt(self.n * q * (1 - q))
+        lo = floor(self.n * q - spread)
+        hi = ceil(self.n * q + spread)
+        return (self.samples[lo-1] if 1 <= lo <= self.n else None,
+                self.samples[hi-1] if 1 <= hi <= self.n else None)
+
+    def summary(self, level=.95, percentiles=(.5, .9, .99)):
+        '''
+        return: dict of the estimates
+        '''
+        summary = dict(n=self.n, mean=self.mean, var=self.var,
+                       halfwidth=self.halfwidth(level))
+        for q in percentiles:
+            name = 'p{:g}'.format(100 * q)
+            summary[name] = self.percentile(q)
+            summary[name + '_ci'] = self.percentile_ci(q, level)
+        return summary
+
+
+class MonteCarlo:
+    '''
+    replications of one scenario of a Sweep
+    ---
+    evac_time (RunningStats): time the last person got out, per replication
+                              in which anyone did
+    deaths (RunningStats): number of people dead, per replication
+    records (list): the Sweep record of every replication so far
+    '''
+    sweep = None
+    scenario = None
+    evac_time = None
+    deaths = None
+    records = None
+
+    def __init__(self, sweep, scenario, level=.95, target_time=None,
+                 target_deaths=None, min_reps=10, max_reps=1000):
+        '''
+        constructor method
+        ---
+        sweep (Sweep): the precomputed floor and simulation settings
+        scenario (dict): parameters, as made by Sweep.scenarios; its seed is
+                         the seed of every replication's streams
+        level (float): confidence level of the intervals
+        target_time (float): stop once the CI half-width of the mean
+                             evacuation time is at most this
+        target_deaths (float): same, for the mean death count
+        min_reps (int): never stop before this many replications
+        max_reps (int): never run more than this many
+        '''
+        self.sweep = sweep
+        self.scenario = dict(scenario)
+        self.level = level
+        self.target_time = target_time
+        self.target_deaths = target_deaths
+        self.min_reps = min_reps
+        self.max_reps = max_reps
+
+        self.evac_time = RunningStats()
+        self.deaths = RunningStats()
+        self.records = []
+
+    def add(self, record):
+        self.records.append(record)
+        if record['last_exit'] is not None:
+            self.evac_time.add(record['last_exit'])
+        self.deaths.add(record['numdead'])
+
+    def done(self):
+        '''
+        return: whether every target is met (never, without targets)
+        '''
+        if len(self.records) < self.min_reps:
+            return False
+        if self.target_time is None and self.target_deaths is None:
+            return False
+        # nan half-widths (too few samples) compare False, so keep going
+        for target, stats in ((self.target_time, self.evac_time),
+                              (self.target_deaths, self.deaths)):
+            if target is not None and not stats.halfwidth(self.level) <= target:
+                return False
+        return True
+
+    def run(self, workers=None, threads=False):
+        '''
+        runs replications until the targets are met or max_reps is reached.
+        records are taken in replication order, so the stopping point (and
+        so the estimates) do not depend on the number of workers
+        ---
+        workers, threads: as in Sweep.run
+
+        return: summary dict (see summary())
+        '''
+        scenarios = (dict(self.scenario, replication=r)
+                     for r in range(len(self.records), self.max_reps))
+        records = self.sweep.imap(scenarios, workers, threads)
+        try:
+            for record in records:
+                self.add(record)
+                if self.done():
+                    break
+        finally:
+            records.close()
+
+        return self.summary()
+
+    def summary(self):
+        '''
+        return: dict of the scenario, the number of replications, whether
+        the targets were met, and the estimates of evacuation time and deaths
+        '''
+        return dict(self.scenario,
+                    replications=len(self.records),
+                    converged=self.done(),
+                    level=self.level,
+                    evac_time=self.evac_time.summary(self.level),
+                    deaths=self.deaths.summary(self.level))
+
+
+def main():
+    parser = ArgumentParser(description='replicate the evacuation simulation '
+                                        'until its estimates are precise')
+    parser.add_argument('-i', '--input', type=str,
+                        default='in/twoexitbottleneck.txt',
+                        help='input floor plan file (default: '
+                             'in/twoexitbottleneck.txt)')
+    parser.add_argument('-w', '--weight', type=float, default=None,
+                        help='value of b in y=x+bw, which only matters with '
+                             '--reroute (default: .5 with --reroute, '
+                             'otherwise 0)')
+    parser.add_argument('-r', '--random_state', type=int, default=8675309,
+                        help='seed of all the replications\' streams '
+                             '(default: 8675309)')
+    parser.add_argument('-d', '--fire_rate', type=float, default=2,
+                        help='fire rate (default: 2)')
+    parser.add_argument('-b', '--bottleneck_delay', type=float, default=1,
+                        help='bottleneck delay (default: 1)')
+    parser.add_argument('-t', '--max_time', type=float, default=None,
+                        help='the building collapses at this clock tick')
+    parser.add_argument('-f', '--no_spread_fire', action='store_true',
+                        help='disallow fire to spread around?')
+    parser.add_argument('-e', '--engine', type=str, default='simulus',
+                        choices=['simulus', 'vectorized'],
+                        help='event engine, or vectorized time steps')
+    parser.add_argument('-n', '--max_reps', type=int, default=1000,
+                        help='most replications to run (default: 1000)')
+    parser.add_argument('-m', '--min_reps', type=int, default=10,
+                        help='fewest replications to run (default: 10)')
+    parser.add_argument('--target_time', type=float, default=None,
+                        help='stop once the CI half-width of the mean '
+                             'evacuation time is at most this')
+    parser.add_argument('--target_deaths', type=float, default=None,
+                        help='stop once the CI half-width of the mean death '
+                             'count is at most this')
+    parser.add_argument('-l', '--level', type=float, default=.95,
+                        help='confidence level (default: .95)')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='worker processes (default: one per cpu, 0 runs '
+                             'everything in this process)')
+    parser.add_argument('--threads', action='store_true',
+                        help='use worker threads instead of processes')
+    parser.add_argument('--no_cache', action='store_true',
+                        help='always precompute the distance fields instead '
+                             'of using the on-disk cache')
+    parser.add_argument('--reroute', type=float, default=None,
+                        help='route around crowded exits, weighing them by '
+                             '-w, refreshed this often (default: off)')
+    parser.add_argument('--hazard', type=float, default=None,
+                        help='spread fire, smoke and heat over the whole '
+                             'floor at once, this often (default: one square '
+                             'at a time)')
+    parser.add_argument('--octile', action='store_true',
+                        help='diagonal steps are sqrt(2) long, and never cut '
+                             "a wall's corner (default: every step is 1)")
+    args = parser.parse_args()
+    if args.weight is None:
+        args.weight = .5 if args.reroute is not None else 0
+    elif args.weight and args.reroute is None:
+        parser.error('-w only matters with --reroute')
+
+    sweep = Sweep(args.input, maxtime=args.max_time,
+                  spread_fire=not args.no_spread_fire, engine=args.engine,
+                  cache=None if args.no_cache else FieldCache(),
+                  reroute=args.reroute, hazard=args.hazard,
+                  octile=args.octile)
+    scenario, = sweep.scenarios([args.weight], [args.random_state],
+                                [args.fire_rate], [args.bottleneck_delay])
+    mc = MonteCarlo(sweep, scenario, args.level, args.target_time,
+                    args.target_deaths, args.min_reps, args.max_reps)
+    summary = mc.run(args.workers, args.threads)
+
+    print('{} replications{}'.format(
+        summary['replications'],
+        ', targets met' if summary['converged'] else ''))
+    for name in ('evac_time', 'deaths'):
+        stats = summary[name]
+        print('{}: mean {:.3f} +- {:.3f} (n={}, sd {:.3f})'.format(
+            name, stats['mean'], stats['halfwidth'], stats['n'],
+            sqrt(stats['var'])))
+        for q in ('p50', 'p90', 'p99'):
+            # bounds there are too few replications for
+            lo, hi = ('{:.3f}'.format(b) if b is not None else 'n/a'
+                      for b in stats[q + '_ci'])
+            print('  {}: {:.3f}  CI ({}, {})'.format(q, stats[q], lo, hi))
+
+
+if __name__ == '__main__':
+    main()
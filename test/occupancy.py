@@ -0,0 +1,218 @@
+'''
+This file accompanies other files in the evacuation simulation project.
+
+In this file we define 'Occupancy', the number of people on each square of a
+floor against the most a square holds (its capacity, e.g. one person to a
+square of 0.5 m). without it any number of people can share a square. counts
+live in one dense array indexed like FloorGrid.padded, so a move updates two
+entries in O(1). a person whose next square is full steps to the best neighbour
+with room that still brings them closer to safety, or waits where they are.
+like a bottleneck's queue (see bottleneck.py), waiting costs nothing until
+someone makes room: then the first person waiting for that square follows a
+step's time later, so a jam clears from the front one person at a time, as real
+queues do, rather than all at once. the event engine asks one person at a time;
+the vectorized engine resolves everyone moving in a time step at once (see
+admit).
+'''
+
+from collections import deque
+
+import numpy as np
+
+from floorgrid import BIT
+from distfield import cut_corners
+
+INF = float('inf')
+# squares no capacity applies to: safe zones take everyone, and bottlenecks
+# already hold their own queue (see bottleneck.py)
+UNLIMITED = np.iinfo(np.int64).max
+# people waiting for room look again after this many steps' time even if
+# nobody made room, as fire or rerouting may have changed their way on
+PATIENCE = 4
+
+
+def ranks(keys):
+    '''
+    return: rank of each entry of the sorted array `keys` among the entries
+    equal to it, 0 for the first of them
+    '''
+    first = np.ones(keys.size, dtype=bool)
+    first[1:] = keys[1:] != keys[:-1]
+    rank = np.arange(keys.size)
+    return rank - np.maximum.accumulate(np.where(first, rank, 0))
+
+
+class Occupancy:
+    '''
+    people on each square of a floor
+    ---
+    count (ndarray): people on each square, by flat index in grid.padded
+    room (ndarray): most people each square holds
+    waiting (dict): flat index --> people waiting for room on the square,
+                    first come first
+    waiters (dict): person --> (time they started waiting, their scheduled
+                    retry, squares they wait for room on), for the event
+                    engine
+    '''
+    count = None
+    room = None
+    waiting = None
+    waiters = None
+
+    def __init__(self, grid, capacity, pos=()):
+        '''
+        constructor method
+        ---
+        grid (FloorGrid): the floor
+        capacity (int): most people a square holds; safe zones and
+                        bottlenecks hold any number
+        pos (array-like): flat indices of the squares people start on
+        '''
+        if capacity < 1:
+            raise ValueError('a square must hold at least one person, not '
+                             '{}'.format(capacity))
+        bits = grid.padded.ravel()
+        self.room = np.where(bits & (BIT['S'] | BIT['B']), UNLIMITED,
+                             capacity).astype(np.int64)
+        self.count = np.bincount(np.asarray(pos, dtype=np.intp),
+                                 minlength=bits.size).astype(np.int64)
+        self.waiting = {}
+        self.waiters = {}
+
+    def full(self, k):
+        '''
+        return: whether the square at flat index `k` has no room left
+        '''
+        return self.count[k] >= self.room[k]
+
+    def move(self, k, n):
+        '''
+        one person steps from the square at flat index `k` to `n`
+        '''
+        self.count[k] -= 1
+        self.count[n] += 1
+
+    def leave(self, k):
+        '''
+        people leave the floor (safe, or dead) from the squares at flat
+        index(es) `k`
+        '''
+        np.subtract.at(self.count, k, 1)
+
+    def wait(self, i, squares):
+        '''
+        person `i` waits for room on any of the squares at flat indices
+        `squares`
+        '''
+        squares = tuple(squares)
+        for n in squares:
+            self.waiting.setdefault(n, deque()).append(i)
+        self.waiters[i] = (None, None, squares)
+
+    def retry(self, i, since, event):
+        '''
+        person `i`, waiting since time `since`, looks again at the scheduled
+        `event`, unless someone makes room first (see wake)
+        '''
+        squares = self.waiters.get(i, (None, None, ()))[2]
+        self.waiters[i] = (since, event, squares)
+
+    def forget(self, i, squares):
+        '''
+        person `i` no longer waits for room on the squares at flat indices
+        `squares`
+        '''
+        for n in squares:
+            queue = self.waiting.get(n)
+            if queue and i in queue:
+                queue.remove(i)
+
+    def wake(self, k):
+        '''
+        someone made room on the square at flat index `k`
+        ---
+        return: (person, scheduled retry) of the first person waiting for
+        room on it, None if nobody is
+        '''
+        queue = self.waiting.get(k)
+        if not queue:
+            return None
+        i = queue.popleft()
+        since, event, squares = self.waiters[i]
+        # they are on their way, so room made elsewhere goes to the next
+        # in line there
+        self.forget(i, squares)
+        self.waiters[i] = (since, event, ())
+        return i, event
+
+    def stop(self, i):
+        '''
+        person `i` looks again
+        ---
+        return: when they started waiting, None if they were not
+        '''
+        since, event, squares = self.waiters.pop(i, (None, None, ()))
+        self.forget(i, squares)
+        return since
+
+    def detours(self, grid, fields, pos):
+        '''
+        where people go instead when their next square is full: the
+        neighbour of least cost they may step to (see DistanceField.hops)
+        that has room and is closer to safety than where they are
+        ---
+        grid (FloorGrid): the floor
+        fields (DistanceField): its distance fields
+        pos (ndarray): flat indices of the squares people are on
+
+        return: index into the grid's offsets for each, -1 to wait
+        '''
+        bits = grid.padded.ravel()
+        cost = fields.cost
+        nbrs = pos[:, None] + grid.offsets
+        valid = (((bits[nbrs] & (BIT['F'] | BIT['W'])) == 0)
+                 & (self.count[nbrs] < self.room[nbrs]))
+        if fields.octile:
+            valid &= ~cut_corners(grid, pos)
+        ncost = np.where(valid, cost[nbrs], INF)
+        best = ncost.argmin(axis=1)
+        lowest = ncost[np.arange(pos.size), best]
+        return np.where(lowest < cost[pos], best, -1)
+
+    def detour(self, grid, fields, k):
+        '''
+        return: the detour of one person on the square at flat index `k`
+        (see detours), without the overhead of arrays
+        '''
+        bits = grid.padded.ravel()
+        cost = fields.cost
+        count, room = self.count, self.room
+        blocked = BIT['F'] | BIT['W']
+        best, lowest = -1, cost[k]
+        for ix, (di, dj) in enumerate(grid.stencil):
+            n = k + di*(grid.C+2) + dj
+            if bits[n] & blocked or count[n] >= room[n] or cost[n] >= lowest:
+                continue
+            if fields.octile and di and dj and \
+                    (bits[k + di*(grid.C+2)] | bits[k + dj]) & BIT['W']:
+                continue
+            best, lowest = ix, cost[n]
+        return best
+
+    def admit(self, src, dst):
+        '''
+        moves people from the squares at flat indices `src` to `dst` as far
+        as there is room, all at once. of the people heading for the same
+        square, the first ones (in the order given) get in while it has
+        room; room made by people leaving a square is only free to those
+        who try after this
+        ---
+        return: bool array, who moved
+        '''
+        order = np.argsort(dst, kind='stable')
+        sdst = dst[order]
+        moved = np.empty(sdst.size, dtype=bool)
+        moved[order] = ranks(sdst) < self.room[sdst] - self.count[sdst]
+        np.subtract.at(self.count, src[moved], 1)
+        np.add.at(self.count, dst[moved], 1)
+        return moved
@@ -0,0 +1,118 @@
+'''
+This file accompanies other files in the evacuation simulation project.
+
+In this file we benchmark parsing txt floors: for floors of growing size, the
+time FloorParser takes and the peak resident memory of the process parsing
+them. each parse runs in a fresh process, so peaks do not carry over. the
+streaming parser (parse_file) is compared with parsing the text read whole
+(parse):
+
+    python parsebench.py -s 250 500 1000 2000
+'''
+
+from argparse import ArgumentParser, SUPPRESS
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+
+def make_floor(path, n, seed=0):
+    '''
+    writes an n x n txt floor: a safe zone around walls, and a random mix of
+    walls, people and empty squares inside
+    '''
+    rng = np.random.default_rng(seed)
+    tokens = np.array(['   N', '   W', '   P', ' W,F', '   B'])
+    inside = rng.choice(len(tokens), size=(n, n), p=[.75, .15, .06, .02, .02])
+    inside[[0, -1], :] = inside[:, [0, -1]] = 1
+    with open(path, 'w') as out:
+        safe = ';'.join(['   S'] * n)
+        print(safe, file=out)
+        for row in tokens[inside[1:-1]]:
+            print('   S;' + ';'.join(row[1:-1]) + ';   S', file=out)
+        print(safe, file=out)
+
+
+def maxrss():
+    '''
+    return: peak resident memory of this process so far, in MiB
+    '''
+    # ru_maxrss may carry over the parent's peak across fork and exec;
+    # linux's VmHWM starts afresh with the new program
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / (1 << 10)
+    except OSError:
+        pass
+    # kilobytes on linux, bytes on macos
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1 << 20 if sys.platform == 'darwin' else 1 << 10)
+
+
+def measure(path, method):
+    '''
+    parses `path` in this process
+    ---
+    return: seconds taken, peak MiB before parsing, peak MiB after, MiB of
+    the parsed attribute array
+    '''
+    from floorparse import FloorParser
+
+    before = maxrss()
+    start = time.perf_counter()
+    with open(path) as f:
+        if method == 'stream':
+            grid = FloorParser().parse_file(f)
+        else:
+            grid = FloorParser().parse(f.read())
+    elapsed = time.perf_counter() - start
+    return elapsed, before, maxrss(), grid.padded.nbytes / (1 << 20)
+
+
+def main():
+    parser = ArgumentParser(description='benchmark parsing of txt floors')
+    parser.add_argument('-s', '--sizes', type=int, nargs='+',
+                        default=[250, 500, 1000, 2000],
+                        help='side lengths of the floors (default: 250 500 '
+                             '1000 2000)')
+    parser.add_argument('-m', '--methods', type=str, nargs='+',
+                        default=['stream', 'whole'],
+                        choices=['stream', 'whole'],
+                        help='parse_file on the open file, or parse on the '
+                             'text read whole')
+    parser.add_argument('--measure', nargs=2, metavar=('PATH', 'METHOD'),
+                        help=SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        print(*measure(*args.measure))
+        return
+
+    print('{:>6} {:>8} {:>7} {:>9} {:>10} {:>10} {:>9}'.format(
+        'size', 'method', 'txt MiB', 'parse s', 'base MiB', 'peak MiB',
+        'grid MiB'))
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            path = os.path.join(tmp, 'floor{}.txt'.format(n))
+            make_floor(path, n)
+            size = os.path.getsize(path) / (1 << 20)
+            for method in args.methods:
+                out = subprocess.run(
+                    [sys.executable, __file__, '--measure', path, method],
+                    check=True, capture_output=True, text=True,
+                    cwd=os.path.dirname(os.path.abspath(__file__)))
+                elapsed, before, after, grid = map(float, out.stdout.split())
+                print('{:>6} {:>8} {:>7.1f} {:>9.3f} {:>10.1f} {:>10.1f} '
+                      '{:>9.1f}'.format(n, method, size, elapsed, before,
+                                        after, grid))
+
+
+if __name__ == '__main__':
+    main()
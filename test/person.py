@@ -2,19 +2,27 @@
 This file accompanies other files in the evacuation simulation project.
 people: Nick B., Matthew J., Aalok S.
 
-In this file we define a useful class for the agent, 'Person'
+In this file we define a useful class for the agent, 'Person', and
+'Population', many of them stored as arrays
 '''
 
+import numpy as np
+
+
 class Person:
-    id = None
-    rate = None  # 移動一個單位距離所需的時間
-    strategy = None  # 代理選擇最近出口的機率
-    loc = None, None  # 變數，追踪此代理的位置（xy座標）
+    # 屬性放在 __slots__ 裡，每個代理不再帶一個 __dict__；預設值在建構方法裡設定
+    __slots__ = (
+        'id',
+        'rate',  # 移動一個單位距離所需的時間
+        'strategy',  # 代理選擇最近出口的機率
+        'loc',  # 變數，追踪此代理的位置（xy座標）
 
-    alive = True  # TODO 應該去掉這個變數嗎？我們實際上不太需要它
-    safe = False  # 成功退出後標記為安全。有助於追踪還有多少人需要完成
+        'alive',  # TODO 應該去掉這個變數嗎？我們實際上不太需要它
+        'safe',  # 成功退出後標記為安全。有助於追踪還有多少人需要完成
 
-    exit_time = 0  # 這個代理從起點到達安全區所花的時間
+        'exit_time',  # 這個代理從起點到達安全區所花的時間
+        'dose',  # 累積吸入的煙霧與熱的劑量（見 hazard.py），達到1即死亡
+    )
 
     def __init__(self, id, rate: float = 1.0, strategy: float = 0.5, loc: tuple = None):
         '''
@@ -29,6 +37,10 @@ class Person:
         self.rate = rate
         self.strategy = strategy
         self.loc = tuple(loc)
+        self.alive = True
+        self.safe = False
+        self.exit_time = 0
+        self.dose = 0
         
         #print('rate:', rate, 'strategy:', strategy,"\n")
 
@@ -57,4 +69,167 @@ class Person:
         elif attrs['F']:
             self.alive = False
 
-        return loc
\ No newline at end of file
+        return loc
+
+    def goto(self, loc, safe=False):
+        '''
+        移動到 loc，用於查表 (見 distfield.DistanceField.hops) 而不是自己比較鄰居的情況
+        ---
+        loc (tuple): 要移動到的位置
+        safe (bool): loc 是否為安全區
+
+        return: loc
+        '''
+        self.loc = loc
+        if safe:
+            self.safe = True
+        return loc
+
+
+def column(name):
+    '''
+    return: 代理物件的一個屬性，讀寫 Population 裡名為 name 的陣列的第 id 個元素
+    (讀出的是 Python 的 float 或 bool)
+    '''
+    def get(self):
+        return getattr(self.population, name).item(self.id)
+
+    def set(self, value):
+        getattr(self.population, name)[self.id] = value
+    return property(get, set)
+
+
+class PersonView:
+    '''
+    Population 裡一個代理的代理物件 (proxy)：id 是它在陣列中的索引，其他屬性
+    直接讀寫 Population 的陣列，所以 Person 的方法 (move, goto) 照樣可用。和
+    Person 類別組合使用 (見 Population)
+    '''
+    __slots__ = ()
+    population = None
+
+    rate = column('rate')
+    strategy = column('strategy')
+    alive = column('alive')
+    safe = column('safe')
+    exit_time = column('exit_time')
+    dose = column('dose')
+
+    @property
+    def loc(self):
+        loc = self.population.loc
+        return loc.item(self.id, 0), loc.item(self.id, 1)
+
+    @loc.setter
+    def loc(self, loc):
+        self.population.loc[self.id] = loc
+
+
+class Population:
+    '''
+    一群代理，每個屬性存成一個陣列 (structure of arrays)，而不是每人一個 Person
+    物件：每人約 46 bytes，一個 Person 物件連同它的 float 與 tuple 則要數百
+    bytes。整群的統計是陣列的運算；population[i] 在需要時才產生第 i 人的代理物件
+    (proxy)，用起來和 Person 一樣
+    ---
+    id (ndarray): 代理的唯一標識符，即它的索引
+    rate (ndarray): 移動速率
+    strategy (ndarray): 選擇最近出口的機率
+    loc (ndarray): 位置（列, 行），形狀 (n, 2)
+    alive (ndarray): 是否存活
+    safe (ndarray): 是否已到達安全區
+    exit_time (ndarray): 被算作安全的時間，尚未安全的是 nan
+    dose (ndarray): 累積吸入的煙霧與熱的劑量
+    view (type): 代理物件的類別
+    '''
+    id = None
+    rate = None
+    strategy = None
+    loc = None
+    alive = None
+    safe = None
+    exit_time = None
+    dose = None
+    view = None
+
+    def __init__(self, rate, strategy, loc, cls=Person):
+        '''
+        建構方法
+        ---
+        rate (array-like): 每個代理的移動速率
+        strategy (array-like): 每個代理選擇最近出口的機率
+        loc (array-like): 每個代理的初始位置（xy座標）
+        cls (type): Person 或它的子類別，代理物件用它的方法 (例如 move)；
+                    代理物件不呼叫它的建構方法，也不保留陣列以外的屬性
+        '''
+        self.rate = np.asarray(rate, dtype=float)
+        n = self.rate.size
+        self.id = np.arange(n, dtype=np.int32)
+        self.strategy = np.asarray(strategy, dtype=float)
+        self.loc = np.asarray(loc, dtype=np.int32).reshape(n, 2)
+        self.alive = np.ones(n, dtype=bool)
+        self.safe = np.zeros(n, dtype=bool)
+        self.exit_time = np.full(n, np.nan)
+        self.dose = np.zeros(n)
+        self.view = type(cls.__name__, (PersonView, cls),
+                         {'__slots__': (), 'population': self})
+
+    def __len__(self):
+        return self.id.size
+
+    def __getitem__(self, i):
+        '''
+        return: 第 i 人的代理物件
+        '''
+        n = self.id.size
+        if i < 0:
+            i += n
+        if not 0 <= i < n:
+            raise IndexError('population index out of range')
+        p = object.__new__(self.view)
+        p.id = int(i)
+        return p
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    @property
+    def nbytes(self):
+        '''
+        return: 陣列佔用的記憶體 (bytes)
+        '''
+        return sum(a.nbytes for a in (self.id, self.rate, self.strategy,
+                                      self.loc, self.alive, self.safe,
+                                      self.exit_time, self.dose))
+
+    def flat(self, grid):
+        '''
+        return: 每個代理所在位置在 grid.padded.ravel() 中的索引 (見 FloorGrid.flat)
+        '''
+        return (self.loc[:, 0] + 1) * (grid.C + 2) + self.loc[:, 1] + 1
+
+    def active(self):
+        '''
+        return: bool 陣列，每個代理是否還在路上（存活且尚未安全）
+        '''
+        return self.alive & ~self.safe
+
+    def tally(self):
+        '''
+        模擬結束後的統計，和 FireSim 的計數器一致
+        ---
+        return: (安全, 死亡, 受傷) 的人數。受傷的是大樓倒塌 (maxtime) 時正
+        走進安全區的人；其他既不安全也沒受傷的人都算死亡
+        '''
+        out = ~np.isnan(self.exit_time)
+        safe = int(out.sum())
+        injured = int((self.safe & self.alive & ~out).sum())
+        return safe, len(self) - safe - injured, injured
+
+    def exit_times(self):
+        '''
+        return: 已安全的代理被算作安全的時間，由小到大
+        '''
+        exit_time = self.exit_time[~np.isnan(self.exit_time)]
+        exit_time.sort()
+        return exit_time
\ No newline at end of file
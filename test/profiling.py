@@ -0,0 +1,153 @@
+'''
+This file accompanies other files in the evacuation simulation project.
+
+In this file we define 'Profiler', the counters and timers of a FireSim run:
+calls and time spent in each of its hot methods, the events scheduled on the
+simulus calendar per simulated second, and the size of the calendar over
+simulated time. a FireSim only has its methods wrapped when it is given a
+Profiler, so runs without one pay nothing. the report is a JSON-ready dict;
+evacuate.py writes it with --profile, and can also run the simulation under
+cProfile and save the stats for pstats:
+
+    python evacuate.py -i in/floorplan1.txt -g --profile run.json --pstats run.prof
+    python -m pstats run.prof
+'''
+
+import cProfile
+import json
+from functools import wraps
+import time
+
+
+class Profiler:
+    '''
+    counters and timers of one run
+    ---
+    timers (dict): name --> [calls, seconds spent in them]
+    scheduled (int): events scheduled on the simulus calendar
+    calendar (list): (simulated time, events on the calendar), sampled every
+                     `interval` units of simulated time as events are
+                     scheduled
+    interval (float): simulated time between samples of the calendar
+    wall (float): seconds the simulation ran for
+    sim_time (float): simulated time the run ended at
+    '''
+    timers = None
+    scheduled = 0
+    calendar = None
+    interval = None
+    wall = 0.
+    sim_time = 0.
+
+    # methods of FireSim, and of the vectorized engine, that are timed
+    methods = ('precompute', 'update_person', 'update_fire', 'update_hazard',
+               'update_route', 'update_bottleneck', 'spread_fire',
+               'hazard_step', 'visualize')
+    engine_methods = ('step', 'release')
+
+    def __init__(self, interval=1.):
+        '''
+        constructor method
+        ---
+        interval (float): simulated time between samples of the calendar
+        '''
+        self.timers = {}
+        self.calendar = []
+        self.interval = interval
+        self._next_sample = 0.
+
+    def wrap(self, name, fn):
+        '''
+        return: `fn`, counting its calls and the time spent in them under
+        `name`
+        '''
+        timer = self.timers.setdefault(name, [0, 0.])
+        clock = time.perf_counter
+
+        @wraps(fn)
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                timer[0] += 1
+                timer[1] += clock() - start
+        return timed
+
+    def instrument(self, obj, methods=None):
+        '''
+        replaces methods of `obj` (by default, the FireSim methods above) by
+        timed wrappers, on the instance only. events scheduled afterwards
+        call the wrappers
+        '''
+        for name in methods or self.methods:
+            fn = getattr(obj, name, None)
+            if fn is not None and not hasattr(fn, '__wrapped__'):
+                setattr(obj, name, self.wrap(name, fn))
+        return obj
+
+    def watch(self, sim):
+        '''
+        counts the events scheduled on a simulus simulator, and samples the
+        size of its calendar
+        '''
+        sched = sim.sched
+
+        @wraps(sched)
+        def counted(*args, **kwargs):
+            self.scheduled += 1
+            if sim.now >= self._next_sample:
+                self.calendar.append((sim.now, len(sim._eventlist.pqueue)))
+                self._next_sample = sim.now + self.interval
+            return sched(*args, **kwargs)
+        sim.sched = counted
+        self._next_sample = sim.now
+        return sim
+
+    def run(self, fn, *args, pstats=None, **kwargs):
+        '''
+        runs the simulation `fn(*args, **kwargs)`, timing it, and under
+        cProfile if `pstats` is given
+        ---
+        pstats (str): where to write cProfile's stats, for the pstats module
+
+        return: what fn returns
+        '''
+        profile = cProfile.Profile() if pstats else None
+        start = time.perf_counter()
+        if profile is not None:
+            profile.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            if profile is not None:
+                profile.disable()
+            self.wall += time.perf_counter() - start
+            if profile is not None:
+                profile.dump_stats(pstats)
+
+    def report(self):
+        '''
+        return: dict of the counters and timers, ready for json
+        '''
+        timers = {name: {'calls': calls, 'total': total,
+                         'mean': total / calls if calls else 0.}
+                  for name, (calls, total) in sorted(self.timers.items())}
+        return {
+            'wall_time': self.wall,
+            'sim_time': self.sim_time,
+            'timers': timers,
+            'events': {
+                'scheduled': self.scheduled,
+                'per_sim_second': (self.scheduled / self.sim_time
+                                   if self.sim_time else 0.),
+            },
+            'calendar': [list(sample) for sample in self.calendar],
+        }
+
+    def dump(self, path):
+        '''
+        writes the report to a JSON file
+        '''
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
@@ -1,21 +1,91 @@
-import subprocess
+'''
+runs evacuate.py's simulation over a grid of parameters, in-process (see
+sweep.py), and outputs one record per run
+'''
 
-# 存结果的陣列
-results = []
-run_times = 5
+from argparse import ArgumentParser
+import csv
+import json
+import sys
 
+from sweep import Sweep
+from fieldcache import FieldCache
 
-for i in range(run_times):
-    # 執行命令並記錄輸出結果
-    output = subprocess.run(['python', 'evacuate.py', '-i', 'twb.txt', '-w', str(i/run_times)], capture_output=True, text=True)
 
-    # 將輸出结果加到陣列中
-    results.append(output.stdout)
-
-#印出結果
-print("所有结果:", results)
+def main():
+    parser = ArgumentParser(description='run the evacuation simulation over '
+                                        'a grid of parameters')
+    parser.add_argument('-i', '--input', type=str,
+                        default='in/twoexitbottleneck.txt',
+                        help='input floor plan file (default: '
+                             'in/twoexitbottleneck.txt)')
+    parser.add_argument('-w', '--weight', type=float, nargs='+',
+                        default=None,
+                        help='values of b in y=x+bw, which only matter with '
+                             '--reroute (default: 0 .2 .4 .6 .8 with '
+                             '--reroute, otherwise 0)')
+    parser.add_argument('-r', '--random_state', type=int, nargs='+',
+                        default=[8675309], help='seeds (default: 8675309)')
+    parser.add_argument('-d', '--fire_rate', type=float, nargs='+',
+                        default=[2], help='fire rates (default: 2)')
+    parser.add_argument('-b', '--bottleneck_delay', type=float, nargs='+',
+                        default=[1], help='bottleneck delays (default: 1)')
+    parser.add_argument('-t', '--max_time', type=float, default=None,
+                        help='the building collapses at this clock tick')
+    parser.add_argument('-f', '--no_spread_fire', action='store_true',
+                        help='disallow fire to spread around?')
+    parser.add_argument('-e', '--engine', type=str, default='simulus',
+                        choices=['simulus', 'vectorized'],
+                        help='event engine, or vectorized time steps')
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help='worker processes (default: one per cpu, 0 runs '
+                             'everything in this process)')
+    parser.add_argument('--threads', action='store_true',
+                        help='use worker threads instead of processes')
+    parser.add_argument('--no_cache', action='store_true',
+                        help='always precompute the distance fields instead '
+                             'of using the on-disk cache')
+    parser.add_argument('--reroute', type=float, default=None,
+                        help='route around crowded exits, weighing them by '
+                             '-w, refreshed this often (default: off)')
+    parser.add_argument('--hazard', type=float, default=None,
+                        help='spread fire, smoke and heat over the whole '
+                             'floor at once, this often (default: one square '
+                             'at a time)')
+    parser.add_argument('--octile', action='store_true',
+                        help='diagonal steps are sqrt(2) long, and never cut '
+                             "a wall's corner (default: every step is 1)")
+    parser.add_argument('-o', '--output', type=str, default=None,
+                        help='write the records to a .csv or .json file '
+                             '(default: csv to stdout)')
+    args = parser.parse_args()
+    if args.weight is None:
+        args.weight = [i/5 for i in range(5)] if args.reroute is not None \
+            else [0]
+    elif any(args.weight) and args.reroute is None:
+        parser.error('-w only matters with --reroute')
 
+    sweep = Sweep(args.input, maxtime=args.max_time,
+                  spread_fire=not args.no_spread_fire, engine=args.engine,
+                  cache=None if args.no_cache else FieldCache(),
+                  reroute=args.reroute, hazard=args.hazard,
+                  octile=args.octile)
+    scenarios = sweep.scenarios(args.weight, args.random_state,
+                                args.fire_rate, args.bottleneck_delay)
+    records = sweep.run(scenarios, args.workers, args.threads)
 
+    if args.output and args.output.endswith('.json'):
+        with open(args.output, 'w') as out:
+            json.dump(records, out, indent=2)
+        return
 
+    out = open(args.output, 'w', newline='') if args.output else sys.stdout
+    writer = csv.DictWriter(out, fieldnames=list(records[0]))
+    writer.writeheader()
+    writer.writerows(records)
+    if out is not sys.stdout:
+        out.close()
 
 
+if __name__ == '__main__':
+    main()
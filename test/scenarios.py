@@ -0,0 +1,134 @@
+'''
+This file accompanies other files in the evacuation simulation project.
+
+In this file we define 'ScenarioGenerator', which turns one floor into many
+randomized scenarios, as ../randomgenerator.py has always done one at a time:
+every wall, normal, medium (M) and hot (H) square catches fire with a small
+probability, and otherwise normal, medium and hot squares are occupied by
+people with a probability of their own, or left normal. the floor is loaded
+once into an attribute array, the squares each rule applies to are found
+once, and each scenario is drawn with a few array operations from its own
+PCG64 stream, so scenario i of a seed is the same however many are drawn.
+scenarios come out as attribute arrays or FloorGrids in memory, or are
+written out as a batch of txt or binary floor files.
+'''
+
+import os
+
+import numpy as np
+
+from randomgen import PCG64
+
+from floorgrid import FloorGrid, BIT
+import floorload
+import floorfile
+
+
+class ScenarioGenerator:
+    '''
+    randomized occupancy and fire seeds of one floor
+    ---
+    grid (FloorGrid): the floor scenarios are drawn from
+    cells (dict): flat indices in grid.mask of the squares holding each of
+                  the attributes that are redrawn ('W', 'N', 'M', 'H')
+    fire (float): probability that a wall, normal, medium or hot square
+                  catches fire
+    people (dict): probability that a normal, medium or hot square that did
+                   not catch fire is occupied; medium and hot squares that
+                   are not become normal
+    '''
+    grid = None
+    cells = None
+
+    fire = .01
+    people = {'N': .3, 'M': .45, 'H': .6}
+
+    def __init__(self, floor, fire=None, people=None):
+        '''
+        constructor method
+        ---
+        floor (str or FloorGrid): floor plan file, in any format
+                                  floorload.load opens, or a loaded floor
+        fire (float): see above (default: .01)
+        people (dict): see above, updating the defaults
+        '''
+        self.grid = floor if isinstance(floor, FloorGrid) \
+            else floorload.load(floor)
+        if fire is not None:
+            self.fire = fire
+        self.people = dict(self.people, **(people or {}))
+
+        mask = self.grid.mask.ravel()
+        self.cells = {att: np.flatnonzero(mask & BIT[att])
+                      for att in ('W', 'N', 'M', 'H')}
+
+    def mask(self, i, seed=None):
+        '''
+        draws one scenario
+        ---
+        i (int): which scenario of the seed; each has its own stream
+        seed (int): aka. random_state; None draws a fresh seed
+
+        return: RxC uint8 array of attribute bits (see floorgrid.BIT)
+        '''
+        rng = np.random.Generator(PCG64(seed, i))
+        out = self.grid.mask.ravel().copy()
+        for att, cells in self.cells.items():
+            # as the old generator did character by character: first the
+            # fire draw, then, for squares that did not catch fire, the
+            # people draw. each attribute of a square is drawn apart
+            u = rng.random((2, cells.size))
+            fire = u[0] < self.fire
+            occupied = ~fire & (u[1] < self.people.get(att, 0))
+            out[cells] &= ~np.uint8(BIT[att])
+            out[cells[fire]] |= BIT['F']
+            # walls that did not catch fire stay walls
+            rest = BIT['W'] if att == 'W' else BIT['N']
+            out[cells[~fire & ~occupied]] |= rest
+            out[cells[occupied]] |= BIT['P']
+        return out.reshape(self.grid.mask.shape)
+
+    def masks(self, k, seed=None, start=0):
+        '''
+        return: iterator over scenarios start, ..., start+k-1 of `seed`, as
+        attribute arrays (see mask)
+        '''
+        if seed is None:
+            # one fresh seed for the whole batch, so its scenarios differ
+            seed = int(np.random.SeedSequence().entropy % (1 << 63))
+        return (self.mask(i, seed) for i in range(start, start+k))
+
+    def grids(self, k, seed=None, start=0):
+        '''
+        return: iterator over scenarios as FloorGrids with the floor's
+        stencil, not yet precomputed (see masks)
+        '''
+        stencil = self.grid.stencil
+        return (FloorGrid(mask, stencil)
+                for mask in self.masks(k, seed, start))
+
+    def write(self, path, k=1, seed=None, start=0):
+        '''
+        writes a batch of scenarios, making the directory of `path` if need
+        be. one scenario goes to `path`; several are numbered, floorplan1.txt
+        becoming floorplan1-000.txt, floorplan1-001.txt and so on. files
+        ending in .floor are binary floor files (see floorfile.py), others txt
+        ---
+        path (str): where to write
+        k, seed, start: which scenarios (see masks)
+
+        return: list of the paths written
+        '''
+        root, ext = os.path.splitext(path)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        width = max(3, len(str(start + k - 1)))
+        paths = []
+        for i, grid in zip(range(start, start+k), self.grids(k, seed, start)):
+            out = path if k == 1 else '{}-{:0{}d}{}'.format(root, i, width, ext)
+            if ext == '.floor':
+                floorfile.save(out, grid)
+            else:
+                with open(out, 'w') as f:
+                    floorload.totxt(grid, f)
+            paths.append(out)
+        return paths
@@ -0,0 +1,175 @@
+'''
+This file accompanies other files in the evacuation simulation project.
+
+In this file we define 'Sweep', which runs a FireSim over a grid of parameters
+(weight, seed, fire_rate, bottleneck_delay) in-process: the floor is parsed
+and precomputed once, then the scenarios are fanned out over a process pool
+that shares the precomputed floor copy-on-write, and each run comes back as a
+structured record instead of printed text.
+'''
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
+import multiprocessing
+import os
+import threading
+import time
+
+from evacuate import FireSim, make_generators
+import floorload
+from floorgrid import FloorGrid
+
+
+# the sweep a worker process runs scenarios of; set by _init
+_sweep = None
+# each process (or thread) keeps one FireSim and resets it for every run of
+# the sweep that built it (_local.sweep)
+_local = threading.local()
+
+def _init(sweep):
+    global _sweep
+    _sweep = sweep
+
+def _run(scenario):
+    return _sweep.run_one(scenario)
+
+
+class Sweep:
+    '''
+    parameter sweep over one floor
+    ---
+    grid (FloorGrid): the parsed and precomputed floor, shared by all runs
+    '''
+    grid = None
+
+    # parameters of a scenario, in the order of the records' columns
+    params = ('weight', 'seed', 'fire_rate', 'bottleneck_delay')
+
+    def __init__(self, input, maxtime=None, spread_fire=True,
+                 engine='simulus', dt=.1, cache=None, reroute=None,
+                 hazard=None, octile=False):
+        '''
+        constructor method
+        ---
+        input (str or FloorGrid): floor plan file, in any format
+                                  floorload.load opens, or a floor already
+                                  in memory (e.g. a scenarios.py scenario)
+        maxtime, spread_fire, engine, dt: passed on to FireSim.simulate
+        cache (FieldCache): where to look up the floor's distance fields
+        reroute (float): refresh interval of congestion-aware routing (see
+                         FireSim), None to route to the nearest safe zone
+        hazard (float): tick of the fire, smoke and heat model (see
+                        FireSim), None to spread fire one square at a time
+        octile (bool): measure steps in the octile metric (see FireSim)
+        '''
+        self.input = input
+        self.maxtime = maxtime
+        self.spread_fire = spread_fire
+        self.engine = engine
+        self.dt = dt
+        self.reroute = reroute
+        self.hazard = hazard
+        self.octile = octile
+
+        self.grid = input.copy() if isinstance(input, FloorGrid) \
+            else floorload.load(input)
+        floorload.precompute(self.grid, FireSim.exits, cache, octile)
+
+    def scenarios(self, weights=(0,), seeds=(8675309,), fire_rates=(2,),
+                  bottleneck_delays=(1,)):
+        '''
+        return: list of scenarios (dicts), one per combination of parameters
+        '''
+        if self.reroute is None and any(weights):
+            # b only weighs exits' loads, which are only weighed when people
+            # reroute: every weight would run the same scenario
+            raise ValueError('weights other than 0 need reroute')
+        return [dict(zip(self.params, values))
+                for values in product(weights, seeds, fire_rates,
+                                      bottleneck_delays)]
+
+    def run_one(self, scenario):
+        '''
+        runs one scenario on a copy of the precomputed floor
+        ---
+        return: dict record of the scenario's parameters and outcome
+        '''
+        start = time.perf_counter()
+        floor = getattr(_local, 'floor', None)
+        if floor is None or floor.pristine is None or \
+                getattr(_local, 'sweep', None) is not self:
+            # another sweep's floor and settings: start over with ours
+            floor = _local.floor = FireSim(self.grid, reroute=self.reroute,
+                                           hazard=self.hazard,
+                                           octile=self.octile)
+            _local.sweep = self
+        floor.fire_rate = scenario['fire_rate']
+        floor.bottleneck_delay = scenario['bottleneck_delay']
+        floor.b = scenario['weight']
+        floor.reset(seed=scenario['seed'],
+                    replication=scenario.get('replication', 0))
+        floor.simulate(maxtime=self.maxtime, spread_fire=self.spread_fire,
+                       engine=self.engine, dt=self.dt)
+
+        numsafe, numdead, numinjured = floor.people.tally()
+        exit_times = floor.people.exit_times()
+        record = dict(scenario)
+        record.update(
+            numpeople=floor.numpeople,
+            numsafe=numsafe,
+            numdead=numdead,
+            numinjured=numinjured,
+            mean_exit=float(exit_times.mean()) if exit_times.size else None,
+            last_exit=float(exit_times[-1]) if exit_times.size else None,
+            wall_time=time.perf_counter() - start,
+        )
+        return record
+
+    def run(self, scenarios, workers=None, threads=False):
+        '''
+        runs the scenarios over a pool of worker processes. where processes
+        are forked, they inherit the precomputed floor without copying it.
+        every worker builds one FireSim and resets it between runs
+        ---
+        workers (int): number of processes (default: one per cpu); 0 runs
+                       every scenario back-to-back in this process
+        threads (bool): use a pool of threads in this process instead
+
+        return: list of records, in the order of `scenarios`
+        '''
+        return list(self.imap(scenarios, workers, threads))
+
+    def imap(self, scenarios, workers=None, threads=False):
+        '''
+        like run(), but yields the records one by one, in order, as they
+        come in. closing the generator early stops the pool, so callers can
+        stop once they have seen enough
+        '''
+        if workers == 0:
+            for scenario in scenarios:
+                yield self.run_one(scenario)
+            return
+
+        if threads:
+            # keep only a few runs in flight, so stopping early is cheap
+            window = 2 * (workers or os.cpu_count() or 1)
+            with ThreadPoolExecutor(workers) as pool:
+                inflight = deque()
+                try:
+                    for scenario in scenarios:
+                        inflight.append(pool.submit(self.run_one, scenario))
+                        if len(inflight) > window:
+                            yield inflight.popleft().result()
+                    while inflight:
+                        yield inflight.popleft().result()
+                finally:
+                    for future in inflight:
+                        future.cancel()
+            return
+
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context('fork' if 'fork' in methods
+                                          else None)
+        with ctx.Pool(workers, initializer=_init, initargs=(self,)) as pool:
+            yield from pool.imap(_run, scenarios)
@@ -0,0 +1,42 @@
+'''
+This file accompanies other files in the evacuation simulation project.
+
+In this file we test that DistanceField.ignite, which repairs the distance
+fields as fire spreads, agrees with computing them afresh (see
+distfield.check), over a full fire spread on each of the small floors in in/,
+in both metrics.
+
+    python -m pytest test_distfield.py
+'''
+
+import glob
+import os
+import random
+
+import pytest
+
+from distfield import check, find_exits
+from floorparse import FloorParser
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+# floorplan1.txt takes minutes to check after every ignition
+FLOORS = [path for path in sorted(glob.glob(os.path.join(HERE, 'in', '*.txt')))
+          if os.path.basename(path) != 'floorplan1.txt']
+
+
+@pytest.mark.parametrize('octile', [False, True], ids=['unit', 'octile'])
+@pytest.mark.parametrize('path', FLOORS, ids=os.path.basename)
+def test_ignite_matches_compute(path, octile):
+    with open(path) as f:
+        grid = FloorParser().parse_file(f)
+    exits = find_exits(grid)
+    rng = random.Random(8675309)
+    if not grid.has('F').any():
+        # start a fire next to an exit
+        exit = rng.choice(exits)
+        grid[[n for n in grid.nbrs(exit[0])
+              if not (grid[n]['S'] or grid[n]['W'])][0]]['F'] = 1
+
+    # check() compares the fields after every ignition, and raises if they
+    # ever differ
+    assert check(grid, exits, 1, rng.choice, octile) > 0
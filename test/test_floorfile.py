@@ -0,0 +1,76 @@
+'''
+This file accompanies other files in the evacuation simulation project.
+
+In this file we test that binary floor files (see floorfile.py) give back the
+floor they were saved from: its attribute bits, its stencil and, when it was
+precomputed, its exits and distance fields in either metric.
+
+    python -m pytest test_floorfile.py
+'''
+
+import os
+import pickle
+
+import numpy as np
+import pytest
+
+import floorfile
+import floorload
+from floorgrid import ATTRS, STENCIL4
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FLOOR = os.path.join(HERE, 'in', 'twoexitbottleneck.txt')
+
+
+def test_round_trip(tmp_path):
+    grid = floorfile.fromtxt(FLOOR)
+    path = str(tmp_path / 'floor.floor')
+    floorfile.save(path, grid)
+
+    assert floorfile.isfloorfile(path)
+    loaded = floorfile.load(path)
+    assert np.array_equal(loaded.padded, grid.padded)
+    assert loaded.stencil == grid.stencil
+    assert loaded.distances is None
+
+
+@pytest.mark.parametrize('octile', [False, True], ids=['unit', 'octile'])
+def test_round_trip_distances(tmp_path, octile):
+    grid = floorfile.fromtxt(FLOOR)
+    fields = floorload.precompute(grid, octile=octile)
+    path = str(tmp_path / 'floor.floor')
+    floorfile.save(path, grid)
+
+    loaded = floorfile.read(path)
+    assert np.array_equal(loaded.padded, grid.padded)
+    got = loaded.distances
+    assert got is not None and got.octile == octile
+    assert got.exits == fields.exits
+    assert np.array_equal(got.exit, fields.exit)
+    assert np.array_equal(got.fire, fields.fire)
+    # per-exit distances are stored in single precision
+    assert np.array_equal(got.perexit, fields.perexit.astype(np.float32))
+    # and they are reused rather than computed again
+    assert floorload.precompute(loaded, octile=octile) is got
+
+
+def test_frompkl(tmp_path):
+    # the dict graph floorplan.py used to pickle beside a txt floor
+    grid = floorload.load(FLOOR, neighbours=4)
+    graph = {}
+    for (i, j), bits in np.ndenumerate(grid.mask):
+        square = {att: int(bool(bits & 1 << k)) for k, att in enumerate(ATTRS)}
+        square['nbrs'] = grid.nbrs((i, j))
+        graph[(i, j)] = square
+    path = str(tmp_path / 'floor.txt.pkl')
+    with open(path, 'wb') as out:
+        pickle.dump(graph, out)
+
+    converted = floorfile.read(path)
+    assert np.array_equal(converted.mask, grid.mask)
+    assert converted.stencil == STENCIL4
+
+
+def test_not_a_floor_file():
+    with pytest.raises(ValueError):
+        floorfile.load(FLOOR)
@@ -0,0 +1,60 @@
+'''
+This file accompanies other files in the evacuation simulation project.
+
+In this file we test that FireFrontier (see frontier.py) holds the same
+multiset of candidates as gathering them from every burning square, as fire
+spread did before it, after every ignition of a full fire spread. picking a
+uniform index then picks each square as likely as before.
+
+    python -m pytest test_frontier.py
+'''
+
+import os
+import random
+
+import numpy as np
+import pytest
+
+import floorload
+from floorgrid import BIT
+from frontier import FireFrontier
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FLOORS = ['twoexitbottleneck.txt', 'gym2Exit.txt', 'exitbecomesblocked.txt']
+
+
+def candidates(grid):
+    '''
+    return: flat indices of the candidates, gathered from every fire: once
+    per burning neighbour, twice over if not a wall
+    '''
+    bits = grid.padded.ravel()
+    fires = np.flatnonzero(bits & BIT['F'])
+    nbrs = (fires[:, None] + grid.offsets).ravel()
+    nbrs = nbrs[grid.inside.ravel()[nbrs]]
+    nbrs = nbrs[bits[nbrs] & (BIT['S'] | BIT['F']) == 0]
+    return np.concatenate([nbrs, nbrs[bits[nbrs] & BIT['W'] == 0]])
+
+
+@pytest.mark.parametrize('neighbours', [4, 8])
+@pytest.mark.parametrize('name', FLOORS)
+def test_frontier_matches_candidates(name, neighbours):
+    grid = floorload.load(os.path.join(HERE, 'in', name), neighbours)
+    if not grid.has('F').any():
+        grid[grid.locs(grid.has('N'))[0]]['F'] = 1
+    frontier = FireFrontier(grid, grid.locs(grid.has('F')))
+    rng = random.Random(8675309)
+
+    while True:
+        expected = np.sort(candidates(grid))
+        got = [grid.flat(loc) for loc in frontier]
+        # in flat index order, each square as many times as its weight
+        assert got == expected.tolist()
+        if not len(frontier):
+            break
+        loc = frontier[rng.randrange(len(frontier))]
+        grid[loc]['F'] = 1
+        frontier.ignite(loc)
+
+    with pytest.raises(IndexError):
+        frontier[0]
@@ -0,0 +1,67 @@
+'''
+This file accompanies other files in the evacuation simulation project.
+
+In this file we test RunningStats (see montecarlo.py): its online mean and
+variance against computing them from all the samples at once, its
+percentiles, and the order statistics its percentile confidence intervals
+pick.
+
+    python -m pytest test_montecarlo.py
+'''
+
+from math import isnan
+import random
+import statistics
+
+import pytest
+
+from montecarlo import RunningStats
+
+
+def stats_of(samples):
+    stats = RunningStats()
+    for x in samples:
+        stats.add(x)
+    return stats
+
+
+def test_mean_and_variance():
+    rng = random.Random(8675309)
+    samples = [rng.gauss(100, 15) for _ in range(1000)]
+    stats = stats_of(samples)
+    assert stats.n == len(samples)
+    assert stats.mean == pytest.approx(statistics.fmean(samples))
+    assert stats.var == pytest.approx(statistics.variance(samples))
+    assert stats.samples == sorted(samples)
+
+
+def test_too_few_samples():
+    stats = RunningStats()
+    assert isnan(stats.percentile(.5))
+    assert stats.percentile_ci(.5) == (None, None)
+    stats.add(1.)
+    assert isnan(stats.var) and isnan(stats.halfwidth())
+
+
+def test_percentile():
+    stats = stats_of([4., 1., 3., 2., 5.])
+    assert stats.percentile(0) == 1.
+    assert stats.percentile(.5) == 3.
+    assert stats.percentile(1) == 5.
+    assert stats.percentile(.125) == 1.5
+
+
+def test_percentile_ci():
+    # samples 1..n, so a sample is its own 1-based rank
+    stats = stats_of(float(x) for x in range(1, 1001))
+    # n*q = 500, z*sqrt(n*q*(1-q)) = 30.99: ranks 469 and 531
+    assert stats.percentile_ci(.5) == (469., 531.)
+    # n*q = 990, spread 6.17: ranks 983 and 997
+    assert stats.percentile_ci(.99) == (983., 997.)
+
+
+def test_percentile_ci_out_of_range():
+    stats = stats_of(float(x) for x in range(1, 171))
+    # the upper rank, 171, is past the last sample
+    low, high = stats.percentile_ci(.99)
+    assert low == 165. and high is None
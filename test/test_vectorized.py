@@ -0,0 +1,48 @@
+'''
+This file accompanies other files in the evacuation simulation project.
+
+In this file we test that the vectorized engine (see vectorized.py) evacuates
+people exactly as the simulus event engine does when fire does not spread:
+the same people get out, at the same times, and everyone ends on the same
+square, on each of the small floors in in/.
+
+    python -m pytest test_vectorized.py
+'''
+
+import glob
+import os
+
+import numpy as np
+import pytest
+
+from evacuate import FireSim, make_generators
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+FLOORS = [path for path in sorted(glob.glob(os.path.join(HERE, 'in', '*.txt')))
+          if os.path.basename(path) != 'floorplan1.txt']
+SETTINGS = {'default': ({}, None),
+            'octile': ({'octile': True}, None),
+            'maxtime': ({}, 8)}
+
+
+def evacuate(path, engine, kwargs, maxtime, seed=8675309):
+    *generators, hazard_generator = make_generators(seed)
+    floor = FireSim(path, *generators, hazard_generator=hazard_generator,
+                    **kwargs)
+    floor.simulate(spread_fire=False, engine=engine, maxtime=maxtime)
+    return floor
+
+
+@pytest.mark.parametrize('setting', SETTINGS)
+@pytest.mark.parametrize('path', FLOORS, ids=os.path.basename)
+def test_engines_agree(path, setting):
+    kwargs, maxtime = SETTINGS[setting]
+    event = evacuate(path, 'simulus', kwargs, maxtime)
+    vectorized = evacuate(path, 'vectorized', kwargs, maxtime)
+
+    assert vectorized.people.tally() == event.people.tally()
+    assert (vectorized.numsafe, vectorized.nummoving) == \
+        (event.numsafe, event.nummoving)
+    assert np.array_equal(vectorized.people.exit_time,
+                          event.people.exit_time, equal_nan=True)
+    assert np.array_equal(vectorized.people.loc, event.people.loc)
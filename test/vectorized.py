@@ -0,0 +1,419 @@
+'''
+This file accompanies other files in the evacuation simulation project.
+
+In this file we define 'VectorizedEngine', an alternative to the simulus event
+engine of FireSim. instead of one scheduled event per person per move, it keeps
+positions, rates and states of all the people in arrays and advances every
+person that is due within a time step at once. when squares have a capacity
+(see occupancy.py), everyone moving in a time step is let into the squares
+they step to at once, earliest first, and room made in a time step wakes
+those waiting for it.
+'''
+
+import numpy as np
+
+from floorgrid import BIT
+from distfield import step_lengths
+from occupancy import PATIENCE, ranks
+
+INF = float('inf')
+
+# person states
+MOVING = 0    # walking, next move at next_t
+QUEUED = 1    # waiting in a bottleneck
+ARRIVED = 2   # reached a safe zone, counted as safe at next_t
+SAFE = 3
+DEAD = 4
+INJURED = 5   # was stepping into a safe zone when the building collapsed
+
+
+class VectorizedEngine:
+    '''
+    time-stepped engine for a FireSim. the model is the same as the event
+    engine's: each person moves to the neighbour closest to a safe zone, taking
+    the length of the step over their rate (see FireSim.step_length), a person
+    whose next square is full steps around it or waits until there is room (see
+    FireSim.next_hop), a busy bottleneck lets its capacity of people through
+    every bottleneck_delay, first come first served, and fire spreads through
+    FireSim.spread_fire (or FireSim.hazard_step) on the same schedule. moves
+    keep their exact times; the time step only decides how many are processed
+    together
+    ---
+    now (float): time the engine has advanced to
+    pos (ndarray): flat index (in FloorGrid.padded) of each person
+    rate (ndarray): movement rate of each person
+    next_t (ndarray): time of each person's next move
+    state (ndarray): one of the states above
+    exit_time (ndarray): time each person was counted safe
+    dose (ndarray): smoke and heat each person took (see hazard.py)
+    depart (ndarray): time of the next departure from each bottleneck square,
+                      inf while its queue is empty
+    capacity (ndarray): people let through per departure, per square
+    want (ndarray): flat index of the square each person waits for room on,
+                    -1 if they do not (or were woken)
+    since (ndarray): time each person started waiting, nan if they do not
+    vacated (list): (squares, times) room was made on since the waiting were
+                    last woken
+    '''
+    sim = None
+    dt = None
+    now = 0
+
+    pos = None
+    rate = None
+    next_t = None
+    state = None
+    exit_time = None
+    dose = None
+    seq = None
+    depart = None
+    capacity = None
+    want = None
+    since = None
+    vacated = None
+
+    def __init__(self, sim, dt=.1):
+        '''
+        constructor method
+        ---
+        sim (FireSim): a set up simulation, whose people and floor to use
+        dt (float): length of a time step
+        '''
+        self.sim = sim
+        self.dt = dt
+
+        grid = sim.graph
+        people = sim.people
+        n = len(people)
+
+        self.pos = people.flat(grid).astype(np.intp)
+        self.rate = people.rate.copy()
+        self.next_t = 1 / self.rate
+        self.state = np.full(n, MOVING, dtype=np.int8)
+        self.exit_time = np.zeros(n)
+        self.dose = np.zeros(n)
+        # order in which people entered bottlenecks: first in, first out
+        self.seq = np.zeros(n, dtype=np.int64)
+        self.nseq = 0
+
+        self.depart = np.full(grid.padded.size, INF)
+        self.capacity = np.ones(grid.padded.size, dtype=np.int64)
+        for loc in sim.bottlenecks:
+            self.capacity[grid.flat(loc)] = sim.capacity(loc)
+
+        self.want = np.full(n, -1, dtype=np.intp)
+        self.since = np.full(n, np.nan)
+        self.vacated = []
+
+    def run(self, maxtime=None, spread_fire=False):
+        '''
+        advances the simulation until everyone is safe or dead, or until
+        maxtime, then writes the outcome back to the FireSim and its people
+        '''
+        sim = self.sim
+        now = self.now
+        next_fire = 1 if spread_fire and not sim.hazard else INF
+        next_hazard = sim.hazard if spread_fire and sim.hazard else INF
+        next_route = sim.reroute or INF
+
+        while (self.state < SAFE).any():
+            if maxtime and now >= maxtime:
+                break
+            now += self.dt
+            self.now = now
+
+            while next_fire <= now:
+                if sim.spread_fire() is None:
+                    next_fire = INF
+                else:
+                    next_fire += (len(sim.graph)
+                                  / max(1, len(sim.fires))**sim.fire_rate)
+            while next_hazard <= now:
+                sim.hazard_step()
+                next_hazard += sim.hazard
+
+            if next_route <= now:
+                active = (self.state == MOVING) | (self.state == QUEUED)
+                sim.refresh_route(self.pos[active],
+                                  self.state[active] == QUEUED)
+                while next_route <= now:
+                    next_route += sim.reroute
+
+            self.step(now, maxtime)
+            # departures due this step, and the moves of those let through
+            while self.release(now, maxtime):
+                self.step(now, maxtime)
+
+            if sim.gui:
+                self.sync()
+                sim.visualize(sim.animation_delay * self.dt)
+
+        self.sync()
+
+    def step(self, now, maxtime=None):
+        '''
+        processes every move due by time `now`, all at once. people fast
+        enough to move more than once in a step are processed again, as are
+        people woken by room made in it
+        '''
+        grid = self.sim.graph
+        bits = grid.padded.ravel()
+        hazard = self.sim.hazard_model
+        offsets = grid.offsets
+        fields = self.sim.fields
+        length = step_lengths(grid) if fields.octile else np.ones(len(offsets))
+        mover = self.sim.person_mover if self.sim.random_ties else None
+        occupancy = self.sim.occupancy
+        state, pos, next_t = self.state, self.pos, self.next_t
+
+        ix = np.flatnonzero(((state == MOVING) | (state == ARRIVED))
+                            & (next_t <= now))
+        while ix.size:
+            seen = ix
+            if occupancy is not None:
+                # those who were waiting for room look again
+                waited = ix[~np.isnan(self.since[ix])]
+                if hazard is not None:
+                    # smoke and heat harm people while they wait too
+                    self.dose[waited] += (hazard.harm.ravel()[pos[waited]]
+                                          * (next_t[waited]
+                                             - self.since[waited]))
+                self.want[waited] = -1
+                self.since[waited] = np.nan
+
+            # standing in fire, or overcome by smoke and heat
+            burning = ((bits[pos[ix]] & BIT['F']) != 0) | (self.dose[ix] >= 1)
+            state[ix[burning]] = DEAD
+            if occupancy is not None:
+                occupancy.leave(pos[ix[burning]])
+                self.vacate(ix[burning])
+            ix = ix[~burning]
+
+            # reached a safe zone on the previous move
+            arrived = state[ix] == ARRIVED
+            state[ix[arrived]] = SAFE
+            self.exit_time[ix[arrived]] = next_t[ix[arrived]]
+            if occupancy is not None:
+                occupancy.leave(pos[ix[arrived]])
+                self.vacate(ix[arrived])
+            ix = ix[~arrived]
+
+            # gradient descent: step to the neighbour closest to safety,
+            # never into fire or walls, as the next-hop table has it
+            if mover is None:
+                best = fields.hop[pos[ix]].astype(np.intp)
+            else:
+                best = np.array([fields.step(k, mover())
+                                 for k in pos[ix].tolist()], dtype=np.intp)
+
+            trapped = best < 0
+            state[ix[trapped]] = DEAD
+            if occupancy is not None:
+                occupancy.leave(pos[ix[trapped]])
+                self.vacate(ix[trapped])
+            ix, best = ix[~trapped], best[~trapped]
+
+            target = pos[ix] + offsets[best]
+            if occupancy is not None:
+                ix, best, target = self.admit(ix, best, target)
+            pos[ix] = target
+            tbits = bits[target]
+            rate = self.rate[ix]
+            if hazard is not None:
+                # smoke slows people down
+                rate = rate * hazard.speed.ravel()[target]
+            t = next_t[ix] + length[best] / rate
+
+            # bottlenecks queue people in the order they arrive
+            queued = (tbits & BIT['B']) != 0
+            order = np.lexsort((ix[queued], next_t[ix[queued]]))
+            qix = ix[queued][order]
+            state[qix] = QUEUED
+            self.seq[qix] = self.nseq + np.arange(qix.size)
+            self.nseq += qix.size
+            # an idle bottleneck's first departure is one delay after the
+            # first person arrives; next_t is when they arrived
+            at = pos[qix]
+            idle = self.depart[at] == INF
+            np.minimum.at(self.depart, at[idle],
+                          next_t[qix[idle]] + self.sim.bottleneck_delay)
+
+            ix, tbits, t = ix[~queued], tbits[~queued], t[~queued]
+            if hazard is not None:
+                # smoke and heat harm people for as long as they take to
+                # cross the square
+                self.dose[ix] += hazard.harm.ravel()[pos[ix]] * (t - next_t[ix])
+            safe = (tbits & BIT['S']) != 0
+            if maxtime:
+                late = t >= maxtime
+                state[ix[late & safe]] = INJURED
+                state[ix[late & ~safe]] = DEAD
+                ix, safe, t = ix[~late], safe[~late], t[~late]
+            state[ix] = np.where(safe, ARRIVED, MOVING)
+            next_t[ix] = t
+
+            # only those just processed, and those woken by the room they
+            # made, can be due again
+            if occupancy is not None:
+                seen = np.union1d(seen, self.wake())
+            ix = seen[((state[seen] == MOVING) | (state[seen] == ARRIVED))
+                      & (next_t[seen] <= now)]
+
+    def admit(self, ix, best, target):
+        '''
+        lets the people `ix` moving together into the squares they step to
+        while there is room, earliest move first (see Occupancy.admit). those
+        left out step around their square if they can (see
+        Occupancy.detours), and otherwise wait where they are for room on it,
+        looking again after a while if nobody makes room (see wake)
+        ---
+        ix (ndarray): the people moving
+        best (ndarray): index into the grid's offsets of each one's step
+        target (ndarray): flat index of the square each one steps to
+
+        return: ix, best and target of those who move, in order of the
+        moves, with the steps of those who step around
+        '''
+        grid = self.sim.graph
+        occupancy = self.sim.occupancy
+        pos = self.pos
+
+        order = np.lexsort((ix, self.next_t[ix]))
+        ix, best, target = ix[order], best[order], target[order]
+        moved = occupancy.admit(pos[ix], target)
+
+        # the others step around, among themselves in the same order
+        out = np.flatnonzero(~moved)
+        if not out.size:
+            self.vacate(ix)
+            return ix, best, target
+        alt = occupancy.detours(grid, self.sim.fields, pos[ix[out]])
+        out, alt = out[alt >= 0], alt[alt >= 0]
+        around = pos[ix[out]] + grid.offsets[alt]
+        ok = occupancy.admit(pos[ix[out]], around)
+        out = out[ok]
+        best[out], target[out], moved[out] = alt[ok], around[ok], True
+
+        self.vacate(ix[moved])
+
+        wait = ix[~moved]
+        self.want[wait] = target[~moved]
+        self.since[wait] = self.next_t[wait]
+        self.next_t[wait] += PATIENCE / self.rate[wait]
+        return ix[moved], best[moved], target[moved]
+
+    def vacate(self, ix):
+        '''
+        records that the people `ix` made room on their squares at their
+        next_t, for those waiting for it (see wake). counts of people on the
+        squares are kept by Occupancy
+        '''
+        self.vacated.append((self.pos[ix], self.next_t[ix]))
+
+    def wake(self):
+        '''
+        for each room made on a square since the last call, brings the next
+        look of the first person waiting for it forward, to a step's time
+        after (see FireSim.wake), unless they look sooner anyway
+        ---
+        return: the people woken
+        '''
+        if not self.vacated:
+            return np.empty(0, dtype=np.intp)
+        at, t = (np.concatenate(a) for a in zip(*self.vacated))
+        self.vacated = []
+        order = np.lexsort((t, at))
+        at, t = at[order], t[order]
+
+        # the k-th to wait for a square gets the k-th room made on it
+        waiting = np.flatnonzero(self.want >= 0)
+        waiting = waiting[np.isin(self.want[waiting], at)]
+        waiting = waiting[np.lexsort((waiting, self.since[waiting],
+                                      self.want[waiting]))]
+        want = self.want[waiting]
+        rank = ranks(want)
+        start = np.searchsorted(at, want)
+        room = rank < np.searchsorted(at, want, side='right') - start
+        waiting = waiting[room]
+        t = np.maximum(t[start[room] + rank[room]] + 1/self.rate[waiting],
+                       self.since[waiting])
+        # they no longer wait for the square, but look again as set here
+        self.want[waiting] = -1
+        woken = t < self.next_t[waiting]
+        self.next_t[waiting[woken]] = t[woken]
+        return waiting[woken]
+
+    def release(self, now, maxtime=None):
+        '''
+        handles every bottleneck departure due by time `now`: each lets the
+        first `capacity` people waiting in its queue through at its departure
+        time, then schedules its next departure if anyone is left, or goes
+        idle
+        ---
+        return: number of people let through
+        '''
+        depart = self.depart
+        ix = np.flatnonzero(self.state == QUEUED)
+        due = depart[self.pos[ix]]
+        # a queued person's next_t is when they arrived; those who arrived
+        # after the departure (later in this step) wait for the next one
+        ix = ix[(due <= now) & (self.next_t[ix] <= due)]
+        if maxtime:
+            # nobody leaves a bottleneck once the building collapsed
+            ix = ix[depart[self.pos[ix]] < maxtime]
+        if not ix.size:
+            return 0
+
+        # rank of each person in their queue, first in first
+        ix = ix[np.lexsort((self.seq[ix], self.pos[ix]))]
+        at = self.pos[ix]
+        first = np.ones(ix.size, dtype=bool)
+        first[1:] = at[1:] != at[:-1]
+        start = np.flatnonzero(first)
+        rank = np.arange(ix.size) - np.repeat(start, np.diff(
+            np.append(start, ix.size)))
+        leaving = rank < self.capacity[at]
+
+        self.state[ix[leaving]] = MOVING
+        self.next_t[ix[leaving]] = depart[at[leaving]]
+
+        # next departures: one delay after this one, or after the next
+        # arrival if the queue emptied in between
+        cells = at[start]
+        nxt = np.full(cells.size, INF)
+        q = np.flatnonzero(self.state == QUEUED)
+        q = q[np.isin(self.pos[q], cells)]
+        if q.size:
+            q = q[np.argsort(self.pos[q], kind='stable')]
+            qpos = self.pos[q]
+            first = np.flatnonzero(np.r_[True, qpos[1:] != qpos[:-1]])
+            arrival = np.minimum.reduceat(self.next_t[q], first)
+            where = np.searchsorted(cells, qpos[first])
+            nxt[where] = (np.maximum(depart[cells[where]], arrival)
+                          + self.sim.bottleneck_delay)
+        depart[cells] = nxt
+        return int(leaving.sum())
+
+    def sync(self):
+        '''
+        writes the arrays back to the FireSim's counters and population
+        '''
+        sim = self.sim
+        grid = sim.graph
+        state = self.state
+
+        safe = np.flatnonzero(state == SAFE)
+        sim.numsafe = safe.size
+        sim.numdead = int((state == DEAD).sum())
+        sim.nummoving = int((state == INJURED).sum())
+
+        people = sim.people
+        people.loc[:, 0], people.loc[:, 1] = np.divmod(self.pos - grid.C - 3,
+                                                       grid.C + 2)
+        people.alive[:] = state != DEAD
+        people.safe[:] = np.isin(state, (ARRIVED, SAFE, INJURED))
+        people.exit_time[:] = np.where(state == SAFE, self.exit_time, np.nan)
+        people.dose[:] = self.dose
+
+        exit_times = people.exit_times()
+        sim.avg_exit = float(exit_times[-1]) if exit_times.size else 0
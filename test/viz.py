@@ -1,8 +1,18 @@
 import matplotlib.pyplot as plt
 from matplotlib.colors import ListedColormap, BoundaryNorm
-from matplotlib import colors, colorbar
+from matplotlib import colors, colorbar, rcParams
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.image import imsave
 import numpy as np
+import os
+from queue import Queue
 from random import Random
+import subprocess
+import threading
+
+from floorgrid import FloorGrid
+from person import Population
 
 
 class Plotter:
@@ -44,14 +54,10 @@ class Plotter:
         plt.scatter(x, y, c=c, cmap=cmap, norm=norm)
 
 
-    def visualize(self, graph={(3,4): {'F': 1}}, people=[], delay=.01):
+    def graph_data(self, graph, attrmap):
         '''
+        colour codes of a dict-of-dicts floor graph
         '''
-
-        # an arbitrary assignment of integers for each of the attributes for our
-        # colormap
-        attrmap = {'N': 0, 'W': 1, 'F': 2, 'S': 3, 'B': 4}
-
         # detect rows and columns
         r, c = 0, 0
         for loc, attrs in graph.items():
@@ -62,13 +68,55 @@ class Plotter:
         gdata = np.zeros(shape=(r, c))
 
         for loc, attrs in graph.items():
-            for att in 'SWBF':
-                if att not in attrs: continue
-                if attrs[att]:
-                    gdata[loc] = attrmap[att]
-                    if att == 'W' and attrs['F']:
-                        gdata[loc] = 5
-                    break
+            gdata[loc] = self.colour(attrs, attrmap)
+
+        return gdata
+
+
+    def colour(self, attrs, attrmap):
+        '''
+        colour code of one square, from its attributes
+        '''
+        for att in 'SWBF':
+            if att not in attrs: continue
+            if attrs[att]:
+                if att == 'W' and attrs['F']:
+                    return 5
+                return attrmap[att]
+        return 0
+
+
+    def grid_data(self, grid, attrmap):
+        '''
+        colour codes of a FloorGrid, straight from its attribute arrays
+        '''
+        gdata = np.zeros(shape=grid.shape)
+        F = grid.has('F')
+
+        # lowest precedence first, so 'S' wins over 'W' over 'B' over 'F'
+        gdata[F] = attrmap['F']
+        gdata[grid.has('B')] = attrmap['B']
+        W = grid.has('W')
+        gdata[W] = attrmap['W']
+        gdata[W & F] = 5
+        gdata[grid.has('S')] = attrmap['S']
+
+        return gdata
+
+
+    # an arbitrary assignment of integers for each of the attributes for our
+    # colormap
+    attrmap = {'N': 0, 'W': 1, 'F': 2, 'S': 3, 'B': 4}
+
+    def visualize(self, graph={(3,4): {'F': 1}}, people=[], delay=.01):
+        '''
+        '''
+        attrmap = self.attrmap
+
+        if isinstance(graph, FloorGrid):
+            gdata = self.grid_data(graph, attrmap)
+        else:
+            gdata = self.graph_data(graph, attrmap)
 
         # use the accumulated data to draw the grid
         self.draw_grid(gdata)
@@ -78,14 +126,10 @@ class Plotter:
             row, col = p.loc
             R = Random(p.id)
             x, y = col-.5 + R.random(), row-.5 + R.random()
-            if p.safe: c = 2
-            elif not p.alive: c = 1
-            elif p.alive: c = 0
-            else: c = 3 # unknown state??
 
             X += [x]
             Y += [y]
-            C += [c]
+            C += [self.state(p)]
 
         self.draw_people(X, Y, C)
 
@@ -93,6 +137,29 @@ class Plotter:
         plt.draw()
         plt.pause(delay)
         plt.clf()
+
+
+    def state(self, p):
+        '''
+        colour code of a person
+        '''
+        if p.safe: return 2
+        elif not p.alive: return 1
+        elif p.alive: return 0
+        else: return 3 # unknown state??
+
+    def states(self, people):
+        '''
+        colour codes of everyone in a Population, at once
+        '''
+        return np.where(people.safe, 2, np.where(people.alive, 0, 1))
+
+
+    def ignite(self, loc):
+        '''
+        tells the plotter the square at `loc` caught fire. this one redraws
+        the whole floor every frame, so there is nothing to do
+        '''
         
 
     #加上關視窗的程式  
@@ -100,6 +167,199 @@ class Plotter:
         plt.close('all')
 
 
+class Recorder(Plotter):
+    '''
+    headless Plotter that records frames instead of showing them, for long
+    runs on machines without a display. one off-screen figure is reused:
+    frames only update the data of its image and scatter, the colours of the
+    floor are kept up to date square by square as fire spreads (see
+    ignite()), and a background thread writes the frames out, so the
+    simulation never sleeps or waits on the disk
+    ---
+    output (str): .mp4 file (needs ffmpeg), or a directory or a printf-style
+                  pattern (e.g. 'frames/%05d.png') for a sequence of images
+    fps (int): frames per second of the video
+    gdata (ndarray): colour codes of the floor
+    frames (int): frames recorded so far
+    '''
+    output = None
+    fps = None
+    graph = None
+    gdata = None
+    frames = 0
+
+    figure = None
+    image = None
+    scatter = None
+    jitter = None
+
+    def __init__(self, output, fps=10, dpi=100, size=6, backlog=64):
+        '''
+        constructor method
+        ---
+        output (str): where to write the frames (see above)
+        fps (int): frames per second, of .mp4 output
+        dpi (int), size (float): resolution, and size in inches of the
+                                 longer side of the frames
+        backlog (int): frames waiting to be written before the simulation
+                       waits for the writer
+        '''
+        self.output = output
+        self.fps = fps
+        self.dpi = dpi
+        self.size = size
+        self.error = None
+
+        if not output.endswith('.mp4') and '%' not in output:
+            os.makedirs(output, exist_ok=True)
+
+        self.queue = Queue(backlog)
+        self.writer = threading.Thread(target=self.write, daemon=True)
+        self.writer.start()
+
+    def setup(self, graph, people):
+        '''
+        draws the first frame of a floor, making the figure if need be
+        '''
+        self.graph = graph
+        if isinstance(graph, FloorGrid):
+            self.gdata = self.grid_data(graph, self.attrmap)
+        else:
+            self.gdata = self.graph_data(graph, self.attrmap)
+        r, c = self.gdata.shape
+
+        # the same jitter of each person in every frame
+        ids = people.id.tolist() if isinstance(people, Population) else \
+            [p.id for p in people]
+        self.jitter = np.array([[R.random() - .5, R.random() - .5]
+                                for R in map(Random, ids)]
+                               ).reshape(-1, 2)
+
+        if self.figure is None or self.image.get_array().shape != (r, c):
+            m = max(r, c)
+            self.figure = Figure(figsize=(self.size*c/m, self.size*r/m),
+                                 dpi=self.dpi)
+            self.canvas = FigureCanvasAgg(self.figure)
+            ax = self.figure.add_axes([0, 0, 1, 1])
+            ax.axis('off')
+
+            cmap = colors.ListedColormap(['lightblue', 'black', 'red',
+                                          'lightgreen', 'darkblue', '#520000'])
+            norm = colors.BoundaryNorm([-.5, .5, 1.5, 2.5, 3.5, 4.5, 5.5],
+                                       cmap.N)
+            self.image = ax.imshow(self.gdata, cmap=cmap, norm=norm,
+                                   interpolation='nearest')
+
+            #                              alive     ded        safe
+            cmap = colors.ListedColormap(['blue', '#2b0000', 'darkgreen',
+                                          'yellow']) # unknown
+            norm = colors.BoundaryNorm([-.5, .5, 1.5, 2.5, 3.5], cmap.N)
+            # dots of about half a square
+            cell = 72 * self.size / m
+            self.scatter = ax.scatter([], [], c=np.zeros(0), s=(cell/2)**2,
+                                      cmap=cmap, norm=norm)
+            ax.set_xlim(-.5, c-.5)
+            ax.set_ylim(r-.5, -.5)
+
+    def ignite(self, loc):
+        '''
+        recolours the square at `loc`, which caught fire
+        '''
+        if self.gdata is not None:
+            self.gdata[loc] = self.colour(self.graph[loc], self.attrmap)
+
+    def visualize(self, graph={(3,4): {'F': 1}}, people=[], delay=.01):
+        '''
+        records one frame. `delay` is only there to stand in for Plotter:
+        frames are evenly spaced in the output
+        '''
+        if graph is not self.graph or len(people) != len(self.jitter):
+            self.setup(graph, people)
+
+        self.image.set_data(self.gdata)
+        if isinstance(people, Population) and len(people):
+            # the arrays as they are, without a proxy for each person
+            self.scatter.set_offsets(people.loc[:, ::-1] + self.jitter)
+            self.scatter.set_array(self.states(people))
+        elif people:
+            locs = np.array([p.loc for p in people], dtype=float)
+            self.scatter.set_offsets(locs[:, ::-1] + self.jitter)
+            self.scatter.set_array(np.array([self.state(p) for p in people]))
+        else:
+            self.scatter.set_offsets(np.empty((0, 2)))
+
+        self.canvas.draw()
+        # the canvas reuses its buffer, so the writer gets a copy
+        self.put(np.array(self.canvas.buffer_rgba()))
+
+    def put(self, frame):
+        if self.error is not None:
+            raise self.error
+        self.queue.put(frame)
+        self.frames += 1
+
+    def path(self, i):
+        '''
+        return: file of the i-th frame of an image sequence
+        '''
+        if '%' in self.output:
+            return self.output % i
+        return os.path.join(self.output, 'frame{:05d}.png'.format(i))
+
+    def ffmpeg(self, shape):
+        '''
+        return: ffmpeg process encoding raw RGBA frames from its stdin
+        '''
+        h, w = shape[:2]
+        cmd = [rcParams['animation.ffmpeg_path'], '-y', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'rgba', '-s', '{}x{}'.format(w, h),
+               '-r', str(self.fps), '-i', '-',
+               # yuv420p needs even sides
+               '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', '-pix_fmt', 'yuv420p',
+               self.output]
+        return subprocess.Popen(cmd, stdin=subprocess.PIPE)
+
+    def write(self):
+        '''
+        the writer thread: writes frames as they come, until None comes
+        '''
+        proc = None
+        i = 0
+        while True:
+            frame = self.queue.get()
+            if frame is None:
+                break
+            if self.error is not None:
+                # keep taking frames so the simulation never blocks
+                continue
+            try:
+                if self.output.endswith('.mp4'):
+                    if proc is None:
+                        proc = self.ffmpeg(frame.shape)
+                    proc.stdin.write(frame.tobytes())
+                else:
+                    imsave(self.path(i), frame)
+                i += 1
+            except Exception as e:
+                self.error = e
+
+        if proc is not None:
+            proc.stdin.close()
+            if proc.wait() and self.error is None:
+                self.error = RuntimeError('ffmpeg exited with status {}'
+                                          .format(proc.returncode))
+
+    def close(self):
+        '''
+        waits for every frame to be written
+        '''
+        if self.writer.is_alive():
+            self.queue.put(None)
+            self.writer.join()
+        if self.error is not None:
+            raise self.error
+
+
 for i in range(10):
     break
     x = np.random.random([2, 10])